@@ -1,39 +1,186 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, Response
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
 from typing import Optional
 from datetime import datetime, date
-import stats
+import asyncio
+import gzip
+import hashlib
 import json
+import stats
 import os
+from config import API_FAST_JSON, API_GZIP_MIN_SIZE
+from store import RecordStore, get_store
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# recomputation that can take seconds (reminders, user histories, long ranges) runs
+# here, at most HEAVY_WORKERS at a time, so it never holds up the cheap endpoints
+HEAVY_WORKERS = 1
+_heavy = ThreadPoolExecutor(max_workers=HEAVY_WORKERS, thread_name_prefix="stats-heavy")
+# store refreshes, and every query when the store itself does I/O (sqlite)
+_io = ThreadPoolExecutor(max_workers=8, thread_name_prefix="stats-io")
+REFRESH_INTERVAL = 0.2  # seconds between picking up new records from disk
+_in_memory = False
+
+
+async def _run(fn, *args, heavy=False, **kwargs):
+    """Call a stats function: on the event loop if it only reads the in-memory store, else in an executor."""
+    if _in_memory and not heavy:
+        return fn(*args, **kwargs)
+    executor = _heavy if heavy else _io
+    return await asyncio.get_running_loop().run_in_executor(executor, partial(fn, *args, **kwargs))
+
+
+async def _refresh_loop():
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(REFRESH_INTERVAL)
+        try:
+            await loop.run_in_executor(_io, stats.refresh)
+        except Exception as e:
+            print("⚠️ Ошибка при обновлении данных:", e)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Keep the JSON store refreshed off the event loop, so handlers can read it inline."""
+    global _in_memory
+    store = get_store()
+    if not isinstance(store, RecordStore):
+        yield
+        return
+    store.background_refresh = True
+    await asyncio.get_running_loop().run_in_executor(_io, stats.refresh)
+    _in_memory = True
+    task = asyncio.create_task(_refresh_loop())
+    try:
+        yield
+    finally:
+        task.cancel()
+        _in_memory = False
+        store.background_refresh = False
+
+
+app = FastAPI(title="Statistik API", lifespan=lifespan)
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed, else compact json.dumps.
+
+    Handlers return it directly (see _json), which also skips FastAPI's
+    jsonable_encoder pass; stats results are plain dicts/lists already.
+    """
+
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            # non-str keys: by_hour/by_weekday are keyed by int, as json.dumps turns them into strings
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _json(content):
+    """What a /stats handler returns: a FastJSONResponse with API_FAST_JSON, else the plain dict."""
+    return FastJSONResponse(content) if API_FAST_JSON else content
+
+
+class _Cached:
+    __slots__ = ("version", "etag", "body", "media_type", "gzipped")
+
+    def __init__(self, version, body, media_type):
+        self.version = version
+        self.etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self.body = body
+        self.media_type = media_type
+        self.gzipped = None
+
+
+# (path, normalised query, day) -> _Cached
+_cache = OrderedDict()
+CACHE_SIZE = 256
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
 
-app = FastAPI(title="Statistik API")
+def _accepts_gzip(header):
+    for part in (header or "").split(","):
+        coding, _, params = part.partition(";")
+        if coding.strip().lower() == "gzip":
+            q = params.strip().replace(" ", "")
+            try:
+                return float(q[2:]) > 0 if q.startswith("q=") else True
+            except ValueError:
+                return False
+    return False
 
+
+@app.middleware("http")
+async def stats_cache(request: Request, call_next):
+    """Serve repeated /stats requests from memory until the store changes.
+
+    Entries are keyed by path and sorted query params (plus today's date,
+    which several endpoints default to) and are valid while the store
+    version is unchanged. Responses carry an ETag and a matching
+    If-None-Match gets a 304 without touching the stats. Bodies of at
+    least API_GZIP_MIN_SIZE bytes go out gzipped to clients that accept it,
+    compressed once per entry and with their own ETag.
+    """
+    if request.method != "GET" or not request.url.path.startswith("/stats/"):
+        return await call_next(request)
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())), date.today())
+    version = await _run(stats.data_version)
+    hit = _cache.get(key)
+    if hit is None or hit.version != version:
+        response = await call_next(request)
+        if response.status_code != 200:
+            return response
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        hit = _cache[key] = _Cached(version, body, response.media_type or response.headers.get("content-type"))
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    else:
+        _cache.move_to_end(key)
+
+    body, etag = hit.body, hit.etag
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    gzipped = (API_GZIP_MIN_SIZE and len(body) >= API_GZIP_MIN_SIZE
+               and _accepts_gzip(request.headers.get("accept-encoding")))
+    if gzipped:
+        if hit.gzipped is None:
+            hit.gzipped = await asyncio.get_running_loop().run_in_executor(_io, partial(gzip.compress, body, 6))
+        body, etag = hit.gzipped, etag[:-1] + '-gzip"'
+        headers["Content-Encoding"] = "gzip"
+    headers["ETag"] = etag
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=hit.media_type, headers=headers)
+
+
+# added last so it wraps the cache and 304s get CORS headers too
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 
-def load_db_override():
-    # Ensure stats.load_data reads from local database.json
-    try:
-        return json.load(open('database.json', 'r', encoding='utf-8'))
-    except Exception:
-        return []
-
-
-@app.on_event("startup")
-def startup_event():
-    # wire stats.load_data to use the file-based loader
-    stats.load_data = load_db_override
-
-
 @app.get('/stats/day')
-def stats_day(day: Optional[str] = None):
+async def stats_day(day: Optional[str] = None):
     """Return stats for a specific day. day=YYYY-MM-DD. If omitted, today is used."""
     try:
         if day:
@@ -43,43 +190,39 @@ def stats_day(day: Optional[str] = None):
     except Exception:
         raise HTTPException(status_code=400, detail='Invalid date format, use YYYY-MM-DD')
 
-    res = stats.daily_income(d)
-    return {"date": d.isoformat(), "totals": res}
+    res = await _run(stats.daily_income, d)
+    return _json({"date": d.isoformat(), "totals": res})
 
 
 @app.get('/stats/top')
-def stats_top(n: int = 10):
+async def stats_top(n: int = 10):
     """Return top N users by income."""
-    res = stats.ranking_by_income(n)
-    return {"top": res}
+    res = await _run(stats.ranking_by_income, n)
+    return _json({"top": res})
 
 
 @app.get('/stats/total')
-def stats_total():
+async def stats_total():
     """Return overall totals across the entire database."""
-    res = stats.total_all()
-    return {"totals": res}
+    res = await _run(stats.total_all)
+    return _json({"totals": res})
 
 
 @app.get('/stats/info')
-def stats_info():
+async def stats_info():
     """Return small info about the DB: number of records and source channel (if present)."""
-    try:
-        db = json.load(open('database.json', 'r', encoding='utf-8'))
-    except Exception:
-        db = []
-    source = None
-    if db:
-        # find first record with source
-        for r in db:
-            if r.get('source'):
-                source = r.get('source')
-                break
+    return _json(await _run(_info))
+
+
+def _info():
+    db = stats.load_data()
+    # first record with a source, usually the very first one
+    source = next((r.source for r in db if r.source), None)
     return {"records": len(db), "source": source}
 
 
 @app.get('/stats/range')
-def stats_range(start: Optional[str] = None, end: Optional[str] = None):
+async def stats_range(start: Optional[str] = None, end: Optional[str] = None):
     """Return per-day stats for a date range. Query params: start=YYYY-MM-DD, end=YYYY-MM-DD.
 
     If only start provided, end defaults to start. If neither provided, returns last 7 days.
@@ -103,13 +246,17 @@ def stats_range(start: Optional[str] = None, end: Optional[str] = None):
     if d1 < d0:
         raise HTTPException(status_code=400, detail='end must be >= start')
 
-    res = stats.income_by_days(d0, d1)
-    return {"start": d0.isoformat(), "end": d1.isoformat(), "by_day": res}
+    # a long range builds one dict per day
+    res = await _run(stats.income_by_days, d0, d1, heavy=(d1 - d0).days > 90)
+    return _json({"start": d0.isoformat(), "end": d1.isoformat(), "by_day": res})
 
 
 @app.get('/stats/extremes')
-def stats_extremes(start: Optional[str] = None, end: Optional[str] = None):
-    """Return best and worst non-zero days and combined totals for range."""
+async def stats_extremes(start: Optional[str] = None, end: Optional[str] = None, top_k: Optional[int] = None):
+    """Return best and worst non-zero days and combined totals for range.
+
+    With top_k, also the k best and k worst days (top_best, top_worst).
+    """
     from datetime import timedelta
 
     try:
@@ -128,12 +275,15 @@ def stats_extremes(start: Optional[str] = None, end: Optional[str] = None):
     if d1 < d0:
         raise HTTPException(status_code=400, detail='end must be >= start')
 
-    res = stats.extremes_by_days(d0, d1)
-    return res
+    if top_k is not None and top_k < 1:
+        raise HTTPException(status_code=400, detail='top_k must be >= 1')
+
+    res = await _run(stats.extremes_by_days, d0, d1, top_k)
+    return _json(res)
 
 
 @app.get('/stats/reminders')
-def stats_reminders(day: Optional[str] = None, last_n: int = 50, reminders: int = 1,
+async def stats_reminders(day: Optional[str] = None, last_n: int = 50, reminders: int = 1,
                     sleep_start: int = 0, sleep_end: int = 6, smoothing: bool = True, alpha: float = 0.8):
     """Return suggested reminders for all users for a specific day.
 
@@ -151,35 +301,14 @@ def stats_reminders(day: Optional[str] = None, last_n: int = 50, reminders: int
     except Exception:
         raise HTTPException(status_code=400, detail='Invalid date format, use YYYY-MM-DD')
 
-    # load DB directly
-    try:
-        db = json.load(open('database.json', 'r', encoding='utf-8'))
-    except Exception:
-        db = []
-
-    # gather unique user_ids
-    user_ids = sorted({r.get('user_id') for r in db if r.get('user_id') is not None})
-    result = []
-    for uid in user_ids:
-        summary = stats.user_summary(uid)
-        todo = stats.generate_reminders_from_summary(summary, days=1, last_n=last_n,
-                                                     reminders_per_day=reminders,
-                                                     sleep_start=sleep_start, sleep_end=sleep_end,
-                                                     smoothing=smoothing, alpha=alpha)
-        # filter reminders for the exact target date
-        matched = [t for t in todo if t.get('date') == target.isoformat()]
-        if matched:
-            result.append({
-                'user': summary.get('user'),
-                'user_id': uid,
-                'reminders': matched,
-            })
-
-    return {'date': target.isoformat(), 'count': len(result), 'result': result}
+    result = await _run(stats.reminders_for_day, target, last_n=last_n, reminders_per_day=reminders,
+                        sleep_start=sleep_start, sleep_end=sleep_end,
+                        smoothing=smoothing, alpha=alpha, heavy=True)
+    return _json({'date': target.isoformat(), 'count': len(result), 'result': result})
 
 
 @app.get('/stats/user')
-def stats_user(user_id: Optional[int] = None, last_n: int = 50, reminders: int = 1, days: int = 7,
+async def stats_user(user_id: Optional[int] = None, last_n: int = 50, reminders: int = 1, days: int = 7,
                tz_offset: int = 0, sleep_start: int = 0, sleep_end: int = 6, smoothing: bool = True, alpha: float = 0.8):
     """Return user summary and suggestion TODOs for next `days` days.
 
@@ -192,13 +321,13 @@ def stats_user(user_id: Optional[int] = None, last_n: int = 50, reminders: int =
     if user_id is None:
         raise HTTPException(status_code=400, detail='user_id required')
 
-    summary = stats.user_summary(user_id)
-    # generate reminders using new helper with advanced options
-    todo = stats.generate_reminders_from_summary(summary, days=days, last_n=last_n,
-                                                 reminders_per_day=reminders, tz_offset=tz_offset,
-                                                 sleep_start=sleep_start, sleep_end=sleep_end,
-                                                 smoothing=smoothing, alpha=alpha)
-    return {'summary': summary, 'todo': todo}
+    summary = await _run(stats.user_summary, user_id, heavy=True)
+    # reminders from the user's cached profile, same result as generate_reminders_from_summary
+    todo = await _run(stats.user_reminders, user_id, days=days, last_n=last_n,
+                      reminders_per_day=reminders, tz_offset=tz_offset,
+                      sleep_start=sleep_start, sleep_end=sleep_end,
+                      smoothing=smoothing, alpha=alpha, heavy=True)
+    return _json({'summary': summary, 'todo': todo})
 
 
 @app.get('/')
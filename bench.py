@@ -0,0 +1,304 @@
+# bench.py
+"""Benchmarks for the parser and the stats read paths.
+
+    python bench.py live [n]    post -> /stats/day visibility latency with a fake Telegram client
+    python bench.py parse [n]   parse_message throughput (messages/sec) over n real-format posts
+    python bench.py backfill [n] [workers...]   parser.backfill over n fake history messages
+    python bench.py reminders [users] [n]   /stats/reminders over n records of `users` users
+    python bench.py api [n] [requests]   /stats/day latency while /stats/reminders runs, in-process ASGI
+    python bench.py serialize [n]   JSON render time and bytes on the wire (plain/gzip) per endpoint
+
+Every benchmark runs in a temporary directory: the real database.json is only read
+(for the corpus) and parser's Telegram session file is created there, not in the repo.
+"""
+
+import asyncio
+import bisect
+import json
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+from time import perf_counter
+from types import SimpleNamespace
+
+REPO_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database.json")
+
+
+def message_text(r):
+    """Channel post in the bot's format for a record shaped like database.json entries."""
+    dt = datetime.strptime(r["datetime"], "%Y-%m-%d %H:%M")
+    sym = "₴" if r["currency"] == "UAH" else "₽"
+    return (
+        "📊 **Новая аренда**\n"
+        f"👤 **Пользователь:** @{r['user']} (ID: {r['user_id']})\n"
+        f"🧾 **Аккаунт:** {r['account']}\n"
+        f"⏱️ **Длительность:** {r['duration']} ч.\n"
+        f"📅 **До:** {r['until']} ({(dt + timedelta(hours=3)).strftime('%d.%m.%Y')})\n"
+        f"💳 **Метод:** {r['method']}\n"
+        f"💰 **Сумма:** {r['amount']} {sym}\n"
+        f"🕓 **Время:** {dt.strftime('%d.%m.%Y %H:%M')}"
+    )
+
+
+def sample_record(i, when=None):
+    when = when or datetime.now()
+    return {
+        "user": f"user{i % 500}",
+        "user_id": 1000000 + i % 500,
+        "account": f"{i % 40:03d}",
+        "duration": ("3", "6", "24", "night")[i % 4],
+        "until": "занят до 10:00",
+        "method": ("payrussia", "payukraine")[i % 2],
+        "amount": (150, 300, 550)[i % 3],
+        "currency": ("RUB", "UAH")[i % 2],
+        "datetime": when.strftime("%Y-%m-%d %H:%M"),
+    }
+
+
+class FakeClient:
+    """Just enough of TelegramClient for parser.run_live / parser._fetch."""
+
+    def __init__(self):
+        self.messages = []
+        self.handlers = []
+        self.connected = asyncio.Event()
+
+    def add_event_handler(self, callback, event=None):
+        self.handlers.append(callback)
+
+    async def __aenter__(self):
+        self.connected.set()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.connected.clear()
+
+    async def iter_messages(self, entity, limit=None, min_id=0, offset_id=0, reverse=False):
+        # messages are kept in id order; a scan per page would dominate the backfill bench
+        lo = bisect.bisect_right(self.messages, min_id or 0, key=lambda m: m.id)
+        hi = bisect.bisect_left(self.messages, offset_id, key=lambda m: m.id) if offset_id else len(self.messages)
+        msgs = self.messages[lo:hi]
+        if not reverse:
+            msgs.reverse()
+        for m in msgs[:limit]:
+            yield m
+
+    async def post(self, text):
+        msg = SimpleNamespace(id=len(self.messages) + 1, text=text, date=datetime.now())
+        self.messages.append(msg)
+        for callback in self.handlers:
+            await callback(SimpleNamespace(message=msg))
+        return msg
+
+
+def _percentiles(samples):
+    s = sorted(samples)
+    pick = lambda q: s[min(len(s) - 1, int(q * len(s)))]
+    return f"p50={pick(0.5) * 1000:.2f}ms p99={pick(0.99) * 1000:.2f}ms max={s[-1] * 1000:.2f}ms"
+
+
+async def bench_live(n=200):
+    import parser
+    from store import RecordStore
+
+    fake = FakeClient()
+    task = asyncio.create_task(parser.run_live(fake, catchup_interval=3600))
+    await fake.connected.wait()
+    # a separate store instance, like the API process reading the same files
+    reader = RecordStore()
+    start = datetime.combine(date.today(), datetime.min.time())
+    end = start + timedelta(days=1)
+
+    latencies = []
+    for i in range(n):
+        before = reader.range_totals(start, end)
+        t0 = perf_counter()
+        await fake.post(message_text(sample_record(i)))
+        while reader.range_totals(start, end) == before:
+            await asyncio.sleep(0)
+        latencies.append(perf_counter() - t0)
+    task.cancel()
+    print(f"live ingest -> /stats/day visible, {n} posts: {_percentiles(latencies)}")
+
+
+def corpus(n):
+    """n channel posts: every record of database.json that has a datetime, then synthetic ones."""
+    import json
+    try:
+        with open(REPO_DB, "r", encoding="utf-8") as f:
+            real = [r for r in json.load(f) if r.get("datetime") and r.get("user_id")]
+    except FileNotFoundError:
+        real = []
+    base = datetime(2026, 1, 1)
+    texts = [message_text(r) for r in real[:n]]
+    for i in range(len(texts), n):
+        texts.append(message_text(sample_record(i, base + timedelta(minutes=7 * i))))
+    return texts
+
+
+def bench_parse(n=20000):
+    from parser import parse_message
+
+    texts = corpus(n)
+    t0 = perf_counter()
+    for text in texts:
+        parse_message(text)
+    elapsed = perf_counter() - t0
+    print(f"parse_message: {n} messages in {elapsed:.3f}s, {n / elapsed:,.0f} msg/s")
+
+
+def bench_backfill(n=100000, *workers):
+    import parser
+
+    fake = FakeClient()
+    for i, text in enumerate(corpus(n), 1):
+        fake.messages.append(SimpleNamespace(id=i, text=text, date=datetime.now()))
+    parser.client = fake
+    for w in workers or (1, os.cpu_count()):
+        os.chdir(tempfile.mkdtemp(prefix="statistik-bench-"))
+        parser._dedup = None
+        t0 = perf_counter()
+        asyncio.run(parser.backfill(workers=w))
+        elapsed = perf_counter() - t0
+        print(f"backfill: {n} messages, {w} workers: {elapsed:.2f}s, {n / elapsed:,.0f} msg/s")
+
+
+def bench_reminders(users=2000, n=200000):
+    import stats
+    from store import write_snapshot
+
+    base = datetime(2025, 1, 1)
+    records = []
+    for i in range(n):
+        r = sample_record(i, base + timedelta(minutes=3 * i))
+        r["user"], r["user_id"] = f"user{i % users}", 1000000 + i % users
+        records.append(r)
+    write_snapshot(records)
+    t0 = perf_counter()
+    stats.load_data()
+    loaded = perf_counter() - t0
+    # per-user summaries, as the endpoint used to do
+    t0 = perf_counter()
+    count = 0
+    for uid in stats.user_ids():
+        summary = stats.user_summary(uid)
+        count += len(stats.generate_reminders_from_summary(summary, days=1, last_n=50))
+    per_user = perf_counter() - t0
+    t0 = perf_counter()
+    batch = stats.reminders_for_day(date.today(), last_n=50)
+    batched = perf_counter() - t0
+    t0 = perf_counter()
+    stats.reminders_for_day(date.today(), last_n=50, workers=os.cpu_count())
+    pooled = perf_counter() - t0
+    print(f"reminders: {users} users, {n} records: load {loaded:.2f}s, per-user summaries "
+          f"{per_user:.2f}s ({count}), reminders_for_day {batched:.2f}s ({len(batch)}), "
+          f"with {os.cpu_count()} workers {pooled:.2f}s")
+
+async def bench_api(n=200000, requests=2000, light=16, heavy=4):
+    """`light` clients request /stats/day (uncached) while `heavy` ones recompute reminders."""
+    import random
+
+    import httpx
+
+    import api
+    from store import write_snapshot
+
+    base = datetime(2025, 1, 1)
+    write_snapshot([sample_record(i, base + timedelta(minutes=3 * i)) for i in range(n)])
+    days = [(base + timedelta(days=d)).date().isoformat() for d in range(3 * n // 1440)]
+    transport = httpx.ASGITransport(app=api.app)
+    async with api.app.router.lifespan_context(api.app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/stats/total")  # load the store
+        done = asyncio.Event()
+        latencies = []
+        slow = []
+
+        async def light_client(k):
+            for i in range(k, requests, light):
+                t0 = perf_counter()
+                r = await client.get("/stats/day", params={"day": random.choice(days), "i": i})
+                latencies.append(perf_counter() - t0)
+                assert r.status_code == 200
+
+        async def heavy_client(k):
+            i = 0
+            while not done.is_set():
+                t0 = perf_counter()
+                # last_n above PROFILE_LAST_N and a fresh alpha: no profile or response cache
+                await client.get("/stats/reminders", params={"last_n": 1000, "alpha": 0.5 + k / 100 + i / 1e6})
+                slow.append(perf_counter() - t0)
+                i += 1
+
+        heavy_tasks = [asyncio.create_task(heavy_client(k)) for k in range(heavy)]
+        t0 = perf_counter()
+        await asyncio.gather(*(light_client(k) for k in range(light)))
+        elapsed = perf_counter() - t0
+        done.set()
+        await asyncio.gather(*heavy_tasks)
+    print(f"api: {requests} /stats/day with {light} clients, {heavy} clients on /stats/reminders, "
+          f"{n} records: {_percentiles(latencies)}, {requests / elapsed:,.0f} req/s")
+    if slow:
+        print(f"     /stats/reminders: {len(slow)} done, {_percentiles(slow)}")
+
+
+def bench_serialize(n=200000):
+    import gzip
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    import api
+    import stats
+    from store import write_snapshot
+
+    base = datetime(2025, 1, 1)
+    write_snapshot([sample_record(i, base + timedelta(minutes=3 * i)) for i in range(n)])
+    last = (base + timedelta(minutes=3 * n)).date()
+    uid = sample_record(0)["user_id"]
+    payloads = {
+        "/stats/day": {"date": last.isoformat(), "totals": stats.daily_income(last)},
+        "/stats/top?n=20": {"top": stats.ranking_by_income(20)},
+        "/stats/range (1 year)": {"by_day": stats.income_by_days(last - timedelta(days=364), last)},
+        "/stats/user": {"summary": stats.user_summary(uid), "todo": stats.user_reminders(uid, last_n=50)},
+        "/stats/reminders": {"result": stats.reminders_for_day(date.today(), last_n=50)},
+    }
+
+    def timed(fn, content, repeat=5):
+        best = None
+        for _ in range(repeat):
+            t0 = perf_counter()
+            body = fn(content)
+            elapsed = perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        return body, best
+
+    print(f"serialize ({'orjson' if api.orjson else 'json.dumps'}), {n} records:")
+    for name, content in payloads.items():
+        plain, t_default = timed(lambda c: JSONResponse(jsonable_encoder(c)).body, content)
+        fast, t_fast = timed(lambda c: api.FastJSONResponse(c).body, content)
+        assert json.loads(plain) == json.loads(fast)
+        gz, t_gzip = timed(lambda b: gzip.compress(b, 6), fast)
+        print(f"  {name}: {len(plain):,} B, gzip {len(gz):,} B ({t_gzip * 1000:.2f}ms); "
+              f"default {t_default * 1000:.2f}ms, fast {t_fast * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    args = [int(a) for a in sys.argv[2:]]
+    # before anything imports parser, whose TelegramClient opens parser_session.session in the cwd
+    os.chdir(tempfile.mkdtemp(prefix="statistik-bench-"))
+    if cmd == "live":
+        asyncio.run(bench_live(*args))
+    elif cmd == "parse":
+        bench_parse(*args)
+    elif cmd == "backfill":
+        bench_backfill(*args)
+    elif cmd == "reminders":
+        bench_reminders(*args)
+    elif cmd == "api":
+        asyncio.run(bench_api(*args))
+    elif cmd == "serialize":
+        bench_serialize(*args)
+    else:
+        print(__doc__)
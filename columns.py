@@ -0,0 +1,92 @@
+# columns.py
+
+from array import array
+
+from record import Currency
+
+NO_CURRENCY = -1
+RUB = int(Currency.RUB)
+UAH = int(Currency.UAH)
+
+
+class UserCodes:
+    """Dictionary encoding of (user_id, display name) pairs.
+
+    Codes are handed out in order of first appearance, so iterating `keys`
+    gives users in load order (store.user_totals sorts them by earliest record).
+    """
+
+    __slots__ = ("keys", "_codes")
+
+    def __init__(self):
+        self.keys = []
+        self._codes = {}
+
+    def code(self, r):
+        key = (r.user_id, r.user or "без username")
+        c = self._codes.get(key)
+        if c is None:
+            c = self._codes[key] = len(self.keys)
+            self.keys.append(key)
+        return c
+
+    def __len__(self):
+        return len(self.keys)
+
+    def copy(self):
+        users = UserCodes()
+        users.keys = self.keys[:]
+        users._codes = self._codes.copy()
+        return users
+
+
+class Columns:
+    """The fields aggregations read, one typed array per field.
+
+    ts: minutes since the epoch, amount: int amount, currency: Currency
+    value or NO_CURRENCY, user: UserCodes code. Row i of every array
+    describes the same record.
+    """
+
+    __slots__ = ("ts", "amount", "currency", "user")
+
+    def __init__(self):
+        self.ts = array("q")
+        self.amount = array("l")
+        self.currency = array("b")
+        self.user = array("l")
+
+    def __len__(self):
+        return len(self.ts)
+
+    def extend(self, records, users):
+        self.ts.extend([r.ts for r in records])
+        self.amount.extend([r.amount for r in records])
+        self.currency.extend([NO_CURRENCY if r.currency is None else r.currency for r in records])
+        self.user.extend([users.code(r) for r in records])
+
+    def copy(self):
+        cols = Columns()
+        cols.ts = self.ts[:]
+        cols.amount = self.amount[:]
+        cols.currency = self.currency[:]
+        cols.user = self.user[:]
+        return cols
+
+    def truncate(self, n):
+        """Drop rows n and later."""
+        del self.ts[n:]
+        del self.amount[n:]
+        del self.currency[n:]
+        del self.user[n:]
+
+    def totals(self, lo=0, hi=None):
+        """(rub, uah) over rows lo <= i < hi."""
+        hi = len(self.ts) if hi is None else hi
+        rub = uah = 0
+        for amount, currency in zip(self.amount[lo:hi], self.currency[lo:hi]):
+            if currency == RUB:
+                rub += amount
+            elif currency == UAH:
+                uah += amount
+        return rub, uah
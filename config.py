@@ -7,3 +7,23 @@ CHANNEL = 'statisti414141'  # без @
 
 USD_RUB = 80
 USD_UAH = 42
+
+DB_PATH = 'database.json'
+LOG_PATH = 'records.jsonl'  # append-only log of new records, merged into DB_PATH by compaction
+DEDUP_PATH = 'dedup_index.json'  # parser's duplicate index, see dedup.py
+STATE_PATH = 'parser_state.json'  # last processed channel message_id
+
+# "json" (database.json kept in memory) or "sqlite" (run `python sqlite_store.py migrate` first)
+STORAGE_BACKEND = 'json'
+SQLITE_PATH = 'database.sqlite3'
+
+# "python" or "numpy" (vectorized aggregations for the json backend, needs numpy installed)
+STATS_ENGINE = 'python'
+
+PROFILES_PATH = 'profiles.json'  # per-user hour/weekday profiles, see profiles.py
+PROFILE_LAST_N = 200  # recent timestamps kept per user; reminders with a larger last_n read the store
+
+# API responses: orjson serialisation (compact json.dumps without orjson installed),
+# and gzip for /stats bodies of at least this many bytes when the client accepts it (0: never)
+API_FAST_JSON = False
+API_GZIP_MIN_SIZE = 1024
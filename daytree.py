@@ -0,0 +1,132 @@
+# daytree.py
+
+from config import USD_RUB, USD_UAH
+
+
+def day_value(rub, uah):
+    """RUB equivalent of a day's totals as extremes_by_days ranks it, None for an empty day."""
+    if rub == 0 and uah == 0:
+        return None
+    return round(rub + uah / USD_UAH * USD_RUB, 2)
+
+
+def scan_extremes(days):
+    """(best, worst) items of [(date, (rub, uah))] in date order, earliest day on ties; None if all empty."""
+    best = worst = None
+    for day, (rub, uah) in days:
+        v = day_value(rub, uah)
+        if v is None:
+            continue
+        if best is None or v > best[0]:
+            best = (v, (day, rub, uah))
+        if worst is None or v < worst[0]:
+            worst = (v, (day, rub, uah))
+    if best is None:
+        return None
+    return best[1], worst[1]
+
+
+class ExtremeTree:
+    """Segment tree over a list of day values answering range max/min in O(log n).
+
+    Nodes hold the position of the best value below them (-1 for none), so
+    a query returns a position; ties go to the lower position. Values can
+    be appended and the tail truncated, which is all the daily prefix table
+    ever does: new records for the current day truncate and re-append one
+    leaf.
+    """
+
+    __slots__ = ("values", "size", "_max", "_min")
+
+    def __init__(self):
+        self.values = []
+        self.size = 1
+        self._max = [-1, -1]
+        self._min = [-1, -1]
+
+    def __len__(self):
+        return len(self.values)
+
+    def _pick_max(self, a, b):
+        if a < 0:
+            return b
+        if b < 0:
+            return a
+        va, vb = self.values[a], self.values[b]
+        return b if vb > va or (vb == va and b < a) else a
+
+    def _pick_min(self, a, b):
+        if a < 0:
+            return b
+        if b < 0:
+            return a
+        va, vb = self.values[a], self.values[b]
+        return b if vb < va or (vb == va and b < a) else a
+
+    def _set_leaf(self, i, pos):
+        node = self.size + i
+        self._max[node] = self._min[node] = pos
+        node //= 2
+        while node:
+            self._max[node] = self._pick_max(self._max[2 * node], self._max[2 * node + 1])
+            self._min[node] = self._pick_min(self._min[2 * node], self._min[2 * node + 1])
+            node //= 2
+
+    def _rebuild(self):
+        size = self.size
+        leaves = [i if v is not None else -1 for i, v in enumerate(self.values)]
+        leaves += [-1] * (size - len(leaves))
+        self._max = [-1] * size + leaves
+        self._min = [-1] * size + leaves[:]
+        for node in range(size - 1, 0, -1):
+            self._max[node] = self._pick_max(self._max[2 * node], self._max[2 * node + 1])
+            self._min[node] = self._pick_min(self._min[2 * node], self._min[2 * node + 1])
+
+    def append(self, value):
+        """Add a value (None for a day that can't be best or worst) at the end."""
+        self.values.append(value)
+        n = len(self.values)
+        if n > self.size:
+            while self.size < n:
+                self.size *= 2
+            self._rebuild()
+        elif value is not None:
+            self._set_leaf(n - 1, n - 1)
+
+    def copy(self):
+        tree = ExtremeTree()
+        tree.values = self.values[:]
+        tree.size = self.size
+        tree._max = self._max[:]
+        tree._min = self._min[:]
+        return tree
+
+    def truncate(self, n):
+        """Drop positions n and later."""
+        for i in range(n, len(self.values)):
+            if self.values[i] is not None:
+                self._set_leaf(i, -1)
+        del self.values[n:]
+
+    def _query(self, lo, hi, pick, tree):
+        best = -1
+        lo += self.size
+        hi += self.size
+        while lo < hi:
+            if lo & 1:
+                best = pick(best, tree[lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                best = pick(best, tree[hi])
+            lo //= 2
+            hi //= 2
+        return best if best >= 0 else None
+
+    def max(self, lo, hi):
+        """Position of the largest value in [lo, hi), None if there is none."""
+        return self._query(lo, hi, self._pick_max, self._max)
+
+    def min(self, lo, hi):
+        """Position of the smallest value in [lo, hi), None if there is none."""
+        return self._query(lo, hi, self._pick_min, self._min)
@@ -0,0 +1,88 @@
+# dedup.py
+
+import json
+import threading
+
+from config import DEDUP_PATH
+from record import Record
+from store import atomic_write
+
+
+def record_key(r):
+    """Identity of a rental; `r` is a store Record or a freshly parsed dict."""
+    if isinstance(r, Record):
+        return (r.user_id, r.account, r.datetime, r.amount)
+    return (r.get("user_id"), r.get("account"), r.get("datetime"), r.get("amount"))
+
+
+def _message_id(r):
+    return r.message_id if isinstance(r, Record) else r.get("message_id")
+
+
+class DedupIndex:
+    """Hash sets the parser uses to drop records that are already stored.
+
+    A record is a duplicate if its message_id was seen before, or if a record
+    with the same (user_id, account, datetime, amount) exists. The sets are
+    saved to DEDUP_PATH together with the store position they cover, so after
+    a restart only records appended past that position have to be read.
+    add() and save() share a lock: compaction saves from a worker thread
+    while the poll loop keeps adding.
+    """
+
+    def __init__(self):
+        self.message_ids = set()
+        self.keys = set()
+        self._lock = threading.Lock()
+
+    def __contains__(self, r):
+        mid = _message_id(r)
+        if mid and mid in self.message_ids:
+            return True
+        return record_key(r) in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, r):
+        mid = _message_id(r)
+        key = record_key(r)
+        with self._lock:
+            if mid:
+                self.message_ids.add(mid)
+            self.keys.add(key)
+
+    def save(self, store, path=DEDUP_PATH):
+        with self._lock:
+            position = store.position()
+            message_ids = list(self.message_ids)
+            keys = list(self.keys)
+        data = {
+            "position": position,
+            "message_ids": sorted(message_ids),
+            "keys": [list(k) for k in keys],
+        }
+        atomic_write(path, json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+    @classmethod
+    def load(cls, store, path=DEDUP_PATH):
+        """Saved index caught up with the store, or a full rebuild if it can't be."""
+        index = cls()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            tail = store.records_after(data["position"])
+        except (OSError, ValueError, KeyError, TypeError):
+            tail = None
+        if tail is not None:
+            index.message_ids = set(data["message_ids"])
+            index.keys = {tuple(k) for k in data["keys"]}
+            for r in tail:
+                index.add(r)
+            return index
+
+        print("🔁 Перестройка индекса дубликатов")
+        for r in store.records():
+            index.add(r)
+        index.save(store, path)
+        return index
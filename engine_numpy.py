@@ -0,0 +1,121 @@
+# engine_numpy.py
+"""NumPy versions of the store aggregations (config.STATS_ENGINE = "numpy").
+
+NumpyEngine answers the aggregate queries stats.py makes (range_totals,
+totals, daily_totals) from NumPy copies of the JSON store's columns,
+rebuilt when the store's version changes. Everything else is passed
+through to the store, including user_totals, which the store keeps per
+user as records arrive; per-user histograms come from profiles.py.
+
+    python engine_numpy.py    check that both engines agree on database.json
+
+tests/test_engine_parity.py checks the same on generated data.
+"""
+
+import sys
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from columns import RUB, UAH
+from store import day_from_number, day_number, minutes_ceil
+
+
+class NumpyEngine:
+    def __init__(self, store):
+        self.store = store
+        # (version, ts, rub, uah, undated), replaced whole: queries run on several threads
+        self._data = (None, None, None, None, None)
+
+    def __getattr__(self, name):
+        # records(), range(), user_entries() ... come from the store as is
+        return getattr(self.store, name)
+
+    def _load(self):
+        """Refresh the store and return its columns as NumPy arrays: (version, ts, rub, uah, undated).
+
+        The arrays are rebuilt when the store's version changes and published
+        in one assignment, so a query reads ts and the sums of the same version.
+        """
+        store = self.store
+        store.refresh()
+        # version first: the store swaps in a new index before bumping it
+        version = store.version
+        data = self._data
+        if version == data[0]:
+            return data
+        index = store._index
+        cols = index.cols
+        # copies: an array exporting its buffer could no longer be extended by the store
+        ts = np.array(cols.ts, dtype=np.int64)
+        amount = np.array(cols.amount, dtype=np.int64)
+        currency = np.array(cols.currency, dtype=np.int8)
+        data = self._data = (
+            version,
+            ts,
+            np.where(currency == RUB, amount, 0),
+            np.where(currency == UAH, amount, 0),
+            {code: tuple(row) for code, row in index.undated.items()},
+        )
+        return data
+
+    def range_totals(self, start: datetime, end: datetime):
+        _, ts, rub, uah, _ = self._load()
+        lo, hi = np.searchsorted(ts, [minutes_ceil(start), minutes_ceil(end)])
+        return int(rub[lo:hi].sum()), int(uah[lo:hi].sum())
+
+    def totals(self):
+        _, _, rub, uah, undated = self._load()
+        rub = int(rub.sum())
+        uah = int(uah.sum())
+        for r, u, _ in undated.values():
+            rub += r
+            uah += u
+        return rub, uah
+
+    def daily_totals(self, start_date: date, end_date: date):
+        _, ts, rub, uah, _ = self._load()
+        first = day_number(start_date)
+        lo, hi = np.searchsorted(ts, [first * 1440, (day_number(end_date) + 1) * 1440])
+        days = ts[lo:hi] // 1440 - first
+        counts = np.bincount(days)
+        rub = np.bincount(days, weights=rub[lo:hi])
+        uah = np.bincount(days, weights=uah[lo:hi])
+        return {day_from_number(first + int(d)): (int(rub[d]), int(uah[d]))
+                for d in np.flatnonzero(counts)}
+
+
+def check_parity(path=None):
+    """Compare the pure Python store with NumpyEngine over a spread of queries."""
+    from store import RecordStore
+
+    store = RecordStore(path) if path else RecordStore()
+    engine = NumpyEngine(store)
+    dated = store.range(datetime.min, datetime.max)
+    mismatches = []
+
+    def check(name, a, b):
+        if a != b:
+            mismatches.append(name)
+            print(f"❌ {name}: {a!r} != {b!r}")
+
+    check("totals", store.totals(), engine.totals())
+    if dated:
+        first, last = dated[0].datetime, dated[-1].datetime
+        d0 = datetime.strptime(first, "%Y-%m-%d %H:%M") - timedelta(days=2)
+        d1 = datetime.strptime(last, "%Y-%m-%d %H:%M") + timedelta(days=2)
+        check("daily_totals", store.daily_totals(d0.date(), d1.date()),
+              engine.daily_totals(d0.date(), d1.date()))
+        step = max((d1 - d0) / 50, timedelta(minutes=1))
+        cur = d0
+        while cur < d1:
+            for span in (timedelta(hours=7, seconds=30), timedelta(days=1), timedelta(days=9)):
+                check(f"range_totals {cur}", store.range_totals(cur, cur + span),
+                      engine.range_totals(cur, cur + span))
+            cur += step
+    print("✅ Движки совпадают" if not mismatches else f"❌ Расхождений: {len(mismatches)}")
+    return not mismatches
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check_parity(*sys.argv[1:2]) else 1)
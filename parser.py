@@ -1,46 +1,83 @@
 # parser.py
 
+import os
 import re
+import sys
 import json
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from telethon import events
 from telethon.sync import TelegramClient
-from config import API_ID, API_HASH, CHANNEL
+from config import API_ID, API_HASH, CHANNEL, DB_PATH, STATE_PATH
+from store import atomic_write, get_store, write_snapshot
+from dedup import DedupIndex
+from profiles import get_profiles
 
 client = TelegramClient('parser_session', API_ID, API_HASH)
 
+_dedup = None
 
-def parse_message(text):
-    """Парсит текст сообщения формата (пример в задаче) и возвращает dict с полями.
-
-    Ожидаемые поля: user (username or display), user_id (int), account (str), duration (str),
-    until (raw string), method (str), amount (int), currency (RUB/UAH), datetime (ISO '%Y-%m-%d %H:%M').
-    """
-    try:
-        # remove simple markdown artifacts (bold/italic/code) and normalize spaces
-        text = re.sub(r"[\*`_]", "", text)
-        text = text.replace('\xa0', ' ')
-        text = re.sub(r"\s+", " ", text).strip()
 
-        # Пользователь: @username (ID: 1234567890)
-        user_m = re.search(r"👤\s*Пользователь:\s*@?(?P<user>[^\s(]+)\s*\(ID:\s*(?P<id>\d+)\)", text)
+def dedup_index():
+    """Duplicate index for the ingestion path, loaded once per process."""
+    global _dedup
+    if _dedup is None:
+        _dedup = DedupIndex.load(get_store())
+    return _dedup
 
-        # Аккаунт: 006
-        account_m = re.search(r"🧾\s*Аккаунт:\s*(?P<account>\d+)", text)
 
-        # Длительность: night ч.
-        duration_m = re.search(r"⏱️?\s*Длительность:\s*(?P<duration>.+?)\s*ч\.", text)
+# every field starts with its emoji; the text is walked once over these labels
+_LABELS = re.compile("[👤🧾⏱📅💳💰🕓]")
 
-        # До: занят до 10:00 (04.01.2026)
-        until_m = re.search(r"📅\s*До:\s*(?P<until>.+?)\s*\((?P<until_date>\d{2}\.\d{2}\.\d{4})\)", text)
+_FIELDS = {
+    # Пользователь: @username (ID: 1234567890)
+    "👤": re.compile(r"👤\s*Пользователь:\s*@?(?P<user>[^\s(]+)\s*\(ID:\s*(?P<id>\d+)\)"),
+    # Аккаунт: 006
+    "🧾": re.compile(r"🧾\s*Аккаунт:\s*(?P<account>\d+)"),
+    # Длительность: night ч.
+    "⏱": re.compile(r"⏱️?\s*Длительность:\s*(?P<duration>.+?)\s*ч\."),
+    # До: занят до 10:00 (04.01.2026)
+    "📅": re.compile(r"📅\s*До:\s*(?P<until>.+?)\s*\((?P<until_date>\d{2}\.\d{2}\.\d{4})\)"),
+    # Метод: pay_russia
+    "💳": re.compile(r"💳\s*Метод:\s*(?P<method>\S+)"),
+    # Сумма: 550 ₽  (symbol may be ₽ or ₴)
+    "💰": re.compile(r"💰\s*Сумма:\s*(?P<amount>[0-9]+(?:[.,][0-9]+)?)\s*(?P<sym>[₽₴$€])"),
+    # Время: 03.01.2026 23:48
+    "🕓": re.compile(r"🕓\s*Время:\s*(?P<dt>\d{2}\.\d{2}\.\d{4}\s+\d{2}:\d{2})"),
+}
 
-        # Метод: pay_russia
-        method_m = re.search(r"💳\s*Метод:\s*(?P<method>\S+)", text)
 
-        # Сумма: 550 ₽  (symbol may be ₽ or ₴)
-        amount_m = re.search(r"💰\s*Сумма:\s*(?P<amount>[0-9]+(?:[.,][0-9]+)?)\s*(?P<sym>[₽₴$€])", text)
+def parse_message(text):
+    """Парсит текст сообщения формата (пример в задаче) и возвращает dict с полями.
 
-        # Время: 03.01.2026 23:48
-        dt_m = re.search(r"🕓\s*Время:\s*(?P<dt>\d{2}\.\d{2}\.\d{4}\s+\d{2}:\d{2})", text)
+    Ожидаемые поля: user (username or display), user_id (int), account (str), duration (str),
+    until (raw string), method (str), amount (int), currency (RUB/UAH), datetime (ISO '%Y-%m-%d %H:%M').
+    """
+    try:
+        # remove simple markdown artifacts (bold/italic/code) and normalize spaces;
+        # str.split() splits on the same characters as \s, \xa0 included
+        text = " ".join(text.replace("*", "").replace("`", "").replace("_", "").split())
+
+        # Single pass over the emoji labels. Each field pattern is tried anchored at its
+        # label and the first one that matches wins, same as re.search over the whole text.
+        found = {}
+        for label in _LABELS.finditer(text):
+            key = label.group()
+            if key not in found:
+                m = _FIELDS[key].match(text, label.start())
+                if m:
+                    found[key] = m
+
+        user_m = found.get("👤")
+        account_m = found.get("🧾")
+        duration_m = found.get("⏱")
+        until_m = found.get("📅")
+        method_m = found.get("💳")
+        amount_m = found.get("💰")
+        dt_m = found.get("🕓")
 
         if not any([user_m, account_m, duration_m, until_m, method_m, amount_m, dt_m]):
             print("❌ Не найдено ожидаемых полей в сообщении")
@@ -69,7 +106,10 @@ def parse_message(text):
         dt_str = dt_m.group('dt') if dt_m else None
         dt_iso = None
         if dt_str:
-            dt_iso = datetime.strptime(dt_str, "%d.%m.%Y %H:%M").strftime("%Y-%m-%d %H:%M")
+            # "DD.MM.YYYY HH:MM"; datetime() rejects impossible dates just like strptime did
+            day, month, year = dt_str[0:2], dt_str[3:5], dt_str[6:10]
+            datetime(int(year), int(month), int(day), int(dt_str[11:13]), int(dt_str[14:16]))
+            dt_iso = f"{year}-{month}-{day} {dt_str[11:16]}"
 
         return {
             "user": user,
@@ -100,85 +140,324 @@ def load_db(path="database.json"):
 
 
 def save_db(records, path="database.json"):
-    # Sort by datetime ascending (None values go to end)
-    def key_fn(x):
+    # Sort by datetime ascending (records without datetime go first)
+    write_snapshot(records, path)
+
+
+def is_duplicate(index, new):
+    # Дубликат: тот же message_id или та же комбинация user_id, account, datetime и amount
+    return new in index
+
+
+def compact_store():
+    """Merge the record log into the snapshot and save the dedup index and profiles for that point."""
+    store = get_store()
+    # save_records holds the lock too, so no record lands in the snapshot
+    # before the dedup index and the profiles have seen it
+    with store.lock:
+        profiles = get_profiles()
+        profiles.sync(store)
+        store.compact()
+        dedup_index().save(store)
+        profiles.save(store)
+
+
+def load_state(path=STATE_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print("⚠️ Ошибка при чтении состояния парсера:", e)
+        return {}
+
+
+def save_state(state, path=STATE_PATH):
+    atomic_write(path, json.dumps(state).encode("utf-8"))
+
+
+def update_state(**changes):
+    """Re-read the state file and save it with `changes` applied (None removes a key)."""
+    state = load_state()
+    for key, value in changes.items():
+        if value is None:
+            state.pop(key, None)
+        else:
+            state[key] = value
+    save_state(state)
+    return state
+
+
+def last_seen_id():
+    """Highest channel message_id already processed (rental or not).
+
+    Without a saved state, falls back to the newest message_id in the store;
+    0 if there is none either, see _fetch.
+    """
+    last_id = load_state().get("last_message_id")
+    if last_id is None:
+        last_id = max(dedup_index().message_ids, default=0)
+    return last_id
+
+
+def rental_text(msg):
+    """Text of a channel message if it looks like a rental post, else None."""
+    # prefer message text
+    text = getattr(msg, 'text', None) or getattr(msg, 'message', None) or ''
+    if not text:
+        return None
+
+    if not ("📊" in text and "аренда" in text.lower()):
+        return None
+    return text
+
+
+def finish_record(parsed, msg):
+    """Fill in what the message itself knows: fallback datetime, message_id, source."""
+    # if datetime missing, use Telegram message date
+    if not parsed.get('datetime') and getattr(msg, 'date', None):
         try:
-            return datetime.strptime(x.get("datetime", "1970-01-01 00:00"), "%Y-%m-%d %H:%M")
+            parsed['datetime'] = msg.date.strftime('%Y-%m-%d %H:%M')
         except Exception:
-            return datetime(1970, 1, 1)
+            parsed['datetime'] = None
 
-    records_sorted = sorted(records, key=key_fn)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(records_sorted, f, ensure_ascii=False, indent=2)
+    # include message id for deduplication
+    try:
+        parsed['message_id'] = int(getattr(msg, 'id', 0)) if getattr(msg, 'id', None) is not None else None
+    except Exception:
+        parsed['message_id'] = None
 
+    # Помечаем источник (канал), чтобы на фронтенде было видно, откуда запись
+    parsed["source"] = CHANNEL
+    return parsed
+
+
+def message_to_record(msg):
+    """Parsed rental record for a channel message, or None if it isn't a rental."""
+    text = rental_text(msg)
+    if not text:
+        return None
+
+    parsed = parse_message(text)
+    if not parsed:
+        return None
+    return finish_record(parsed, msg)
 
-def is_duplicate(existing, new):
-    # Простая проверка дубликата по комбинации user_id, account, datetime и amount
-    for e in existing:
-        # if message_id present, use it as strongest indicator
-        if new.get("message_id") and e.get("message_id") == new.get("message_id"):
-            return True
-        if e.get("user_id") == new.get("user_id") and e.get("account") == new.get("account") and e.get("datetime") == new.get("datetime") and e.get("amount") == new.get("amount"):
-            return True
-    return False
 
+def save_records(parsed_results, index=True):
+    """Append the records that aren't duplicates to the store. Returns how many were added.
 
-async def fetch_and_save(limit=None):
+    index=False leaves them out of the store's in-memory index until its next
+    refresh (see RecordStore.append); backfill indexes its pages once, at the end.
+    """
+    store = get_store()
+    dedup = dedup_index()
+    # duplicates within the batch are caught here; the shared index only learns
+    # about records once they are on disk, so a failed append can be retried
+    batch = DedupIndex()
+    new_records = []
+    for r in parsed_results:
+        if not is_duplicate(dedup, r) and not is_duplicate(batch, r):
+            batch.add(r)
+            new_records.append(r)
+
+    if new_records:
+        with store.lock:
+            # appended to records.jsonl; the snapshot is rewritten only by compaction
+            store.append(new_records, index=index)
+            for r in new_records:
+                dedup.add(r)
+            # reads back just the appended tail into the user profiles
+            get_profiles()
+    return len(new_records)
+
+
+async def fetch_and_save(limit=None, min_id=None):
     """Fetch messages from the channel and save parsed records.
 
     By default fetches all messages (limit=None). If limit is set, will fetch up to that many.
+    With min_id, only messages newer than it are requested, oldest first, and the
+    highest id seen is saved as the new watermark once its records are stored.
+    min_id=0 (no watermark yet) reads the newest `limit` messages instead of the
+    channel's oldest, so a fresh deploy sees new rentals at once; the older
+    history is `python parser.py backfill`'s job.
     """
-    parsed_results = []
     async with client:
-        print(f"📡 Чтение из канала: {CHANNEL}")
+        await _fetch(client, limit, min_id)
+
+
+async def _fetch(tg, limit, min_id):
+    """fetch_and_save body for an already connected client."""
+    parsed_results = []
+    max_id = min_id or 0
+    print(f"📡 Чтение из канала: {CHANNEL}")
+    if min_id is None:
         # when limit is None, Telethon will iterate entire history
-        async for msg in client.iter_messages(CHANNEL, limit=limit):
-            # prefer message text
-            text = getattr(msg, 'text', None) or getattr(msg, 'message', None) or ''
-            if not text:
-                continue
-
-            if "📊" in text and "аренда" in text.lower():
-                parsed = parse_message(text)
-                # if parser couldn't extract datetime from text, use message date
-                if parsed is None:
-                    # attempt looser parsing on raw text
-                    parsed = parse_message(text)
-
-                if parsed:
-                    # if datetime missing, use Telegram message date
-                    if not parsed.get('datetime') and getattr(msg, 'date', None):
-                        try:
-                            parsed['datetime'] = msg.date.strftime('%Y-%m-%d %H:%M')
-                        except Exception:
-                            parsed['datetime'] = None
-
-                    # include message id for deduplication
-                    try:
-                        parsed['message_id'] = int(getattr(msg, 'id', 0)) if getattr(msg, 'id', None) is not None else None
-                    except Exception:
-                        parsed['message_id'] = None
-
-                    # Помечаем источник (канал), чтобы на фронтенде было видно, откуда запись
-                    parsed["source"] = CHANNEL
-                    parsed_results.append(parsed)
+        messages = tg.iter_messages(CHANNEL, limit=limit)
+    elif not min_id:
+        print("ℹ️ Нет сохранённой позиции: читаем последние сообщения, "
+              "историю загрузит python parser.py backfill")
+        messages = tg.iter_messages(CHANNEL, limit=limit)
+    else:
+        # oldest first, so a capped batch never skips over a gap
+        messages = tg.iter_messages(CHANNEL, limit=limit, min_id=min_id, reverse=True)
+    async for msg in messages:
+        if getattr(msg, 'id', None) is not None and msg.id > max_id:
+            max_id = msg.id
+        parsed = message_to_record(msg)
+        if parsed:
+            parsed_results.append(parsed)
 
     if not parsed_results:
         print("ℹ️ Нет новых записей для сохранения")
+        _advance_watermark(min_id, max_id)
         return
 
-    existing = load_db()
-    added = 0
-    for r in parsed_results:
-        if not is_duplicate(existing, r):
-            existing.append(r)
-            added += 1
-
+    added = save_records(parsed_results)
     if added:
-        save_db(existing)
-        print(f"💾 Добавлено {added} новых записей в database.json")
+        print(f"💾 Добавлено {added} новых записей")
     else:
         print("ℹ️ Новых уникальных записей не найдено")
+    # only after the records are on disk: a crash before this just re-reads the batch
+    _advance_watermark(min_id, max_id)
+
+
+def _advance_watermark(min_id, max_id):
+    if min_id is not None and max_id > min_id:
+        update_state(last_message_id=max_id)
+
+
+async def fetch_new(limit=100):
+    """Fetch only messages posted after the saved watermark (see last_seen_id)."""
+    await fetch_and_save(limit=limit, min_id=last_seen_id())
+
+
+def _parse_batch(texts):
+    # runs in a backfill worker process
+    return [parse_message(t) for t in texts]
+
+
+async def backfill(chunk=2000, workers=None):
+    """Import the whole channel history, parsing on all cores.
+
+    History is paged newest to oldest, `chunk` messages at a time. Each page's
+    rental texts are split across a process pool while the next page is being
+    downloaded, and the results go through the dedup index into the store's
+    log; the store indexes them all at once when compact_store() runs at the end.
+    The lowest message_id stored so far is kept in parser_state.json as
+    "backfill_offset_id", so an interrupted backfill resumes from there.
+    """
+    workers = workers or os.cpu_count() or 1
+    offset_id = load_state().get("backfill_offset_id") or 0
+    if offset_id:
+        print(f"↩️ Продолжаем загрузку истории с message_id < {offset_id}")
+
+    # fork: workers only need parse_message, not a fresh import of this module and its client
+    ctx = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+    loop = asyncio.get_running_loop()
+    seen = added = 0
+    started = time.monotonic()
+
+    async def parse_page(msgs):
+        """Parsed records of one page and the offset_id to resume below it."""
+        candidates = [(m, rental_text(m)) for m in msgs]
+        candidates = [(m, t) for m, t in candidates if t]
+        size = max(1, -(-len(candidates) // workers))
+        batches = [[t for _, t in candidates[i:i + size]] for i in range(0, len(candidates), size)]
+        results = await asyncio.gather(*(loop.run_in_executor(pool, _parse_batch, b) for b in batches))
+        parsed = [p for batch in results for p in batch]
+        return [finish_record(p, m) for (m, _), p in zip(candidates, parsed) if p], msgs[-1].id
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        # start the workers before the client opens its connection
+        pool.submit(_parse_batch, []).result()
+        async with client:
+            pending = None
+            try:
+                while True:
+                    msgs = [m async for m in client.iter_messages(CHANNEL, limit=chunk, offset_id=offset_id)]
+                    if pending:
+                        page_records, page_offset = await pending
+                        pending = None
+                        added += save_records(page_records, index=False)
+                        # the page is stored, it's safe to resume below it
+                        update_state(backfill_offset_id=page_offset)
+                        rate = seen / max(time.monotonic() - started, 1e-9)
+                        print(f"⏳ История: {seen} сообщений, добавлено {added}, {rate:.0f} msg/s, "
+                              f"message_id < {page_offset}")
+                    if not msgs:
+                        break
+                    if not offset_id:
+                        # newest message at the start of a fresh backfill becomes the watermark
+                        update_state(backfill_newest_id=msgs[0].id)
+                    seen += len(msgs)
+                    offset_id = msgs[-1].id
+                    pending = asyncio.ensure_future(parse_page(msgs))
+            finally:
+                if pending:
+                    pending.cancel()
+
+    state = load_state()
+    newest_id = max(state.get("last_message_id") or 0, state.get("backfill_newest_id") or 0)
+    update_state(backfill_offset_id=None, backfill_newest_id=None, last_message_id=newest_id or None)
+    compact_store()
+    print(f"✅ История загружена: {seen} сообщений, добавлено {added} записей")
+
+
+async def run_live(tg=None, catchup_interval=300, limit=100):
+    """Ingest rentals as they are posted instead of polling every few seconds.
+
+    A NewMessage handler on CHANNEL parses and stores each message on arrival.
+    Every `catchup_interval` seconds a watermark poll (as in fetch_new) picks up
+    anything the handler missed, e.g. while disconnected; only that poll moves
+    the watermark, so a gap before a live message is never skipped.
+    `tg` defaults to the module client; anything with the same
+    add_event_handler/iter_messages interface works (e.g. a fake in benchmarks).
+    """
+    tg = tg or client
+
+    async def on_new_message(event):
+        try:
+            parsed = message_to_record(event.message)
+            if parsed and save_records([parsed]):
+                print(f"💾 Новая запись: {parsed.get('user')} {parsed.get('amount')} {parsed.get('currency')}")
+        except Exception as e:
+            print('⚠️ Ошибка при обработке нового сообщения:', e)
+
+    tg.add_event_handler(on_new_message, events.NewMessage(chats=CHANNEL))
+    async with tg:
+        while True:
+            try:
+                await _fetch(tg, limit, last_seen_id())
+            except Exception as e:
+                print('⚠️ Ошибка при догоняющем опросе:', e)
+            await asyncio.sleep(catchup_interval)
+
+
+async def fetch_messages_by_id(ids, batch_size=100, concurrency=4):
+    """{message_id: message} for `ids`, fetched with get_messages(ids=[...]) in batches.
+
+    Up to `concurrency` batches are in flight at once; ids that don't exist
+    (or whose batch failed) are simply missing from the result.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(batch):
+        async with semaphore:
+            try:
+                return await client.get_messages(CHANNEL, ids=batch)
+            except Exception as e:
+                print(f'⚠️ Не удалось получить сообщения {batch[0]}..{batch[-1]}:', e)
+                return []
+
+    batches = [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+    found = {}
+    for msgs in await asyncio.gather(*(fetch(b) for b in batches)):
+        for msg in msgs:
+            if msg is not None:
+                found[msg.id] = msg
+    return found
 
 
 async def repair_db(path="database.json"):
@@ -186,6 +465,7 @@ async def repair_db(path="database.json"):
 
     For each record with obvious markdown artifacts or missing fields, fetch the message by id
     from the configured channel and re-parse it. Also clean simple markdown from string fields.
+    All needed messages are fetched up front in batches (see fetch_messages_by_id).
     """
     def clean_text(s):
         if not isinstance(s, str):
@@ -194,54 +474,50 @@ async def repair_db(path="database.json"):
         s = s.replace('\xa0', ' ')
         return s.strip()
 
+    def needs_fix(rec):
+        # crude heuristics: markdown chars present or missing user/account or amount==0
+        for k in ["user", "account", "duration", "until", "method"]:
+            v = rec.get(k)
+            if isinstance(v, str) and any(ch in v for ch in ['*', '`', '_']):
+                return True
+        return not rec.get('user_id') or rec.get('amount') in (0, None)
+
+    if path == DB_PATH:
+        # merge the record log first, otherwise its records would be missing from the rewrite
+        compact_store()
     db = load_db(path)
-    changed = 0
+    broken = [i for i, rec in enumerate(db) if needs_fix(rec)]
+    if not broken:
+        print("ℹ️ Нет записей, требующих исправления")
+        return
+
+    ids = sorted({db[i]['message_id'] for i in broken if db[i].get('message_id')})
+    print(f"🔧 Записей для исправления: {len(broken)}, сообщений к загрузке: {len(ids)}")
     async with client:
-        for i, rec in enumerate(db):
-            needs_fix = False
-            # crude heuristics: markdown chars present or missing user/account or amount==0
-            for k in ["user", "account", "duration", "until", "method"]:
-                v = rec.get(k)
-                if isinstance(v, str) and any(ch in v for ch in ['*', '`', '_']):
-                    needs_fix = True
-            if not rec.get('user_id') or rec.get('amount') in (0, None):
-                needs_fix = True
-
-            if not needs_fix:
-                continue
-
-            msg_id = rec.get('message_id')
-            if msg_id:
-                try:
-                    msg = await client.get_messages(CHANNEL, ids=msg_id)
-                except Exception as e:
-                    print('⚠️ Не удалось получить сообщение', msg_id, e)
-                    msg = None
-
-                if msg and getattr(msg, 'text', None):
-                    parsed = parse_message(msg.text)
-                    if parsed:
-                        # take parsed values, but keep source and message_id
-                        parsed['source'] = rec.get('source') or CHANNEL
-                        parsed['message_id'] = msg_id
-                        db[i] = parsed
-                        changed += 1
-                        continue
-
-            # fallback: clean textual fields in place
-            for k in ['user', 'account', 'duration', 'until', 'method']:
-                if k in rec:
-                    rec[k] = clean_text(rec[k])
-
-            # if datetime missing but message_id present, try fill from msg.date if available
-            if not rec.get('datetime') and msg_id:
-                try:
-                    msg = await client.get_messages(CHANNEL, ids=msg_id)
-                    if msg and getattr(msg, 'date', None):
-                        rec['datetime'] = msg.date.strftime('%Y-%m-%d %H:%M')
-                        changed += 1
-                except Exception:
-                    pass
+        messages = await fetch_messages_by_id(ids)
+    parsed_by_id = {mid: parse_message(msg.text) for mid, msg in messages.items() if getattr(msg, 'text', None)}
+
+    changed = 0
+    for i in broken:
+        rec = db[i]
+        msg_id = rec.get('message_id')
+        parsed = parsed_by_id.get(msg_id) if msg_id else None
+        if parsed:
+            # take parsed values, but keep source and message_id
+            db[i] = dict(parsed, source=rec.get('source') or CHANNEL, message_id=msg_id)
+            changed += 1
+            continue
+
+        # fallback: clean textual fields in place
+        for k in ['user', 'account', 'duration', 'until', 'method']:
+            if k in rec:
+                rec[k] = clean_text(rec[k])
+
+        # if datetime missing but message_id present, fill from msg.date if available
+        msg = messages.get(msg_id) if msg_id else None
+        if not rec.get('datetime') and msg and getattr(msg, 'date', None):
+            rec['datetime'] = msg.date.strftime('%Y-%m-%d %H:%M')
+            changed += 1
 
     if changed:
         save_db(db, path)
@@ -251,22 +527,40 @@ async def repair_db(path="database.json"):
 
 
 if __name__ == "__main__":
-    import asyncio
     async def loop_forever(poll_interval=10, limit=100):
         """Continuously fetch new messages every `poll_interval` seconds.
 
-        - limit: how many recent messages to fetch each iteration (keeps fetch bounded)
+        - limit: max new messages to fetch each iteration (keeps fetch bounded)
         - poll_interval: seconds between runs
         """
         while True:
             try:
-                await fetch_and_save(limit=limit)
+                await fetch_new(limit=limit)
             except Exception as e:
-                print('⚠️ Ошибка при fetch_and_save в цикле:', e)
+                print('⚠️ Ошибка при fetch_new в цикле:', e)
             await asyncio.sleep(poll_interval)
 
-    # Run the polling loop. This keeps the parser live and updates database.json every 10s.
+    async def compact_forever(interval=300):
+        """Every `interval` seconds merge records.jsonl into the database.json snapshot."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(compact_store)
+            except Exception as e:
+                print('⚠️ Ошибка при слиянии журнала:', e)
+
+    async def main():
+        # python parser.py live -> event-driven ingestion with a 5-minute catch-up poll
+        if len(sys.argv) > 1 and sys.argv[1] == "live":
+            await asyncio.gather(run_live(), compact_forever())
+        # python parser.py backfill [workers] -> import the full history and exit
+        elif len(sys.argv) > 1 and sys.argv[1] == "backfill":
+            await backfill(workers=int(sys.argv[2]) if len(sys.argv) > 2 else None)
+        else:
+            await asyncio.gather(loop_forever(poll_interval=10, limit=100), compact_forever())
+
+    # Run the polling loop. New records go to records.jsonl every 10s, compaction runs in the background.
     try:
-        asyncio.run(loop_forever(poll_interval=10, limit=100))
+        asyncio.run(main())
     except KeyboardInterrupt:
         print('\n🛑 Остановлено пользователем')
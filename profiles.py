@@ -0,0 +1,211 @@
+# profiles.py
+
+import json
+import threading
+from bisect import insort
+
+from config import PROFILE_LAST_N, PROFILES_PATH
+from record import minute_hour, minute_weekday
+from store import atomic_write, get_store
+
+
+class Profile:
+    """What stats needs to know about one user's habits.
+
+    - name, name_ts: name of the user's earliest named record and its ts (0 if
+      undated), the name store.user_entries reports
+    - hours/weekdays: {hour: count} / {weekday: count} over all dated records
+    - hour_first/weekday_first: earliest timestamp seen for each hour/weekday,
+      so the histograms can be listed in order of first appearance
+    - recent: the last PROFILE_LAST_N minute timestamps, in time order
+    - cache: values derived from `recent` (smoothed hour orders), dropped on every update
+    """
+
+    __slots__ = ("name", "name_ts", "hours", "weekdays", "hour_first", "weekday_first", "recent", "cache")
+
+    def __init__(self, name=None, name_ts=0):
+        self.name = name
+        self.name_ts = name_ts
+        self.hours = {}
+        self.weekdays = {}
+        self.hour_first = {}
+        self.weekday_first = {}
+        self.recent = []
+        self.cache = {}
+
+    def copy(self):
+        p = Profile(self.name, self.name_ts)
+        p.hours = self.hours.copy()
+        p.weekdays = self.weekdays.copy()
+        p.hour_first = self.hour_first.copy()
+        p.weekday_first = self.weekday_first.copy()
+        p.recent = self.recent[:]
+        return p
+
+    def add(self, r):
+        if r.user and (not self.name or (r.ts or 0) < self.name_ts):
+            self.name = r.user
+            self.name_ts = r.ts or 0
+        ts = r.ts
+        if ts is None:
+            return
+        _count(self.hours, self.hour_first, minute_hour(ts), ts)
+        _count(self.weekdays, self.weekday_first, minute_weekday(ts), ts)
+        recent = self.recent
+        if not recent or recent[-1] <= ts:
+            recent.append(ts)
+        elif len(recent) < PROFILE_LAST_N or ts >= recent[0]:
+            insort(recent, ts)
+        if len(recent) > PROFILE_LAST_N:
+            del recent[:len(recent) - PROFILE_LAST_N]
+        self.cache.clear()
+
+    def by_hour(self):
+        """{hour: count} in order of first appearance."""
+        return {h: self.hours[h] for h in sorted(self.hours, key=self.hour_first.get)}
+
+    def by_weekday(self):
+        return {d: self.weekdays[d] for d in sorted(self.weekdays, key=self.weekday_first.get)}
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "name_ts": self.name_ts,
+            "hours": [[h, c, self.hour_first[h]] for h, c in self.hours.items()],
+            "weekdays": [[d, c, self.weekday_first[d]] for d, c in self.weekdays.items()],
+            "recent": self.recent,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        p = cls(d["name"], d["name_ts"])
+        for h, c, first in d["hours"]:
+            p.hours[h] = c
+            p.hour_first[h] = first
+        for wd, c, first in d["weekdays"]:
+            p.weekdays[wd] = c
+            p.weekday_first[wd] = first
+        p.recent = d["recent"]
+        return p
+
+
+def _count(counts, first, key, ts):
+    counts[key] = counts.get(key, 0) + 1
+    if key not in first or ts < first[key]:
+        first[key] = ts
+
+
+class ProfileStore:
+    """Per-user profiles kept up to date with the store.
+
+    Profiles are saved to PROFILES_PATH with the store position they cover.
+    sync() reads only what was appended past that position (the log tail on
+    json, new rows on sqlite), so new rentals update the profiles without
+    going over the history again; after a compaction the profiles saved with
+    it are reloaded, and only without usable ones is the history re-read.
+    Queries read the profiles from other threads, so new records go into
+    copies of the profiles they touch and a new dict replaces `profiles`.
+    """
+
+    def __init__(self):
+        self.profiles = {}
+        self.position = None
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        return self.profiles.get(user_id)
+
+    def items(self):
+        """(user_id, Profile) pairs sorted by user_id."""
+        return sorted(self.profiles.items())
+
+    def _add(self, records, profiles=None):
+        """Replace `profiles` with a copy of it (by default the current ones) plus `records`."""
+        profiles = dict(self.profiles if profiles is None else profiles)
+        copied = set()
+        for r in records:
+            uid = r.user_id
+            if uid is None:
+                continue
+            if uid not in copied:
+                p = profiles.get(uid)
+                profiles[uid] = p.copy() if p is not None else Profile()
+                copied.add(uid)
+            profiles[uid].add(r)
+        self.profiles = profiles
+
+    def sync(self, store, path=PROFILES_PATH):
+        """Catch up with records appended to `store`. Returns True if anything changed.
+
+        When the store can't say what is new since our position (first use,
+        or the snapshot was rewritten by a compaction), the saved profiles are
+        tried next, then a full rebuild.
+        """
+        with self._lock:
+            tail = store.tail_after(self.position) if self.position is not None else None
+            saved = None
+            if tail is None:
+                saved, tail = self._read(store, path)
+            if tail is None:
+                self._rebuild(store)
+                return True
+            records, self.position = tail
+            if records or saved is not None:
+                self._add(records, saved)
+            return bool(records)
+
+    def _read(self, store, path):
+        """(saved profiles, the store's tail past them), (None, None) if unusable."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data["last_n"] != PROFILE_LAST_N:
+                return None, None
+            tail = store.tail_after(data["position"])
+            if tail is None:
+                return None, None
+            return {uid: Profile.from_dict(d) for uid, d in data["users"]}, tail
+        except (OSError, ValueError, KeyError, TypeError):
+            return None, None
+
+    def _rebuild(self, store):
+        print("🔁 Перестройка профилей пользователей")
+        # the position the records cover: what was appended since is read by the next sync
+        records, self.position = store.records_with_position()
+        self._add(records, {})
+
+    def save(self, store=None, path=PROFILES_PATH):
+        """Write the profiles; with `store`, as of its current position (right after a compaction)."""
+        with self._lock:
+            if store is not None:
+                self.position = store.position()
+            data = {
+                "position": self.position,
+                "last_n": PROFILE_LAST_N,
+                "users": [[uid, p.to_dict()] for uid, p in self.profiles.items()],
+            }
+            atomic_write(path, json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+
+_profiles = None
+_profiles_lock = threading.Lock()
+
+
+def get_profiles():
+    """The process-wide ProfileStore, synced with get_store() on every call.
+
+    Not when the store is refreshed in the background: then stats.refresh()
+    syncs both.
+    """
+    global _profiles
+    store = get_store()
+    with _profiles_lock:
+        if _profiles is None:
+            _profiles = ProfileStore()
+            if _profiles.sync(store):
+                _profiles.save()
+            return _profiles
+    # with a background-refreshed store, whoever refreshes it syncs the profiles too
+    if not getattr(store, "background_refresh", False):
+        _profiles.sync(store)
+    return _profiles
@@ -0,0 +1,142 @@
+# record.py
+
+import sys
+from datetime import date
+from enum import IntEnum
+
+EPOCH_DAY = date(1970, 1, 1).toordinal()
+
+
+def dt_to_minutes(s):
+    """'YYYY-MM-DD HH:MM' -> minutes since 1970-01-01 00:00 (naive), None if unparsable."""
+    if not s:
+        return None
+    try:
+        day = date(int(s[0:4]), int(s[5:7]), int(s[8:10])).toordinal() - EPOCH_DAY
+        return day * 1440 + int(s[11:13]) * 60 + int(s[14:16])
+    except (TypeError, ValueError):
+        return None
+
+
+def minutes_to_dt(m):
+    """Inverse of dt_to_minutes."""
+    d = date.fromordinal(m // 1440 + EPOCH_DAY)
+    return f"{d.isoformat()} {m % 1440 // 60:02d}:{m % 60:02d}"
+
+
+def minute_hour(m):
+    return m % 1440 // 60
+
+
+def minute_weekday(m):
+    # 1970-01-01 was a Thursday (weekday 3)
+    return (m // 1440 + 3) % 7
+
+
+class Currency(IntEnum):
+    RUB = 0
+    UAH = 1
+
+
+_CURRENCIES = {c.name: c for c in Currency}
+
+FIELDS = frozenset(("user", "user_id", "account", "duration", "until", "method",
+                    "amount", "currency", "datetime", "message_id", "source"))
+
+
+def _intern(s):
+    return sys.intern(s) if type(s) is str else s
+
+
+class Record:
+    """One rental, the in-memory form of a database.json entry.
+
+    The datetime is kept as an int of minutes since the epoch (see
+    dt_to_minutes), the currency as a Currency (None for anything else),
+    and the repetitive strings are interned so users/accounts/methods are
+    shared between records.
+
+    `raw` keeps what those fields can't represent, so to_dict() gives back
+    the entry it was read from and compaction rewrites it unchanged: another
+    currency's name, an amount that isn't an int (sums use int(amount)), an
+    unparsable datetime, keys of its own. None for the usual entry.
+    """
+
+    __slots__ = ("ts", "amount", "currency", "user", "user_id", "account",
+                 "duration", "until", "method", "message_id", "source", "raw")
+
+    def __init__(self, ts, amount, currency, user=None, user_id=None, account="",
+                 duration="", until="", method="", message_id=None, source=None):
+        self.ts = ts
+        self.amount = amount
+        self.currency = currency
+        self.user = user
+        self.user_id = user_id
+        self.account = account
+        self.duration = duration
+        self.until = until
+        self.method = method
+        self.message_id = message_id
+        self.source = source
+        self.raw = None
+
+    @classmethod
+    def from_dict(cls, d):
+        """Record for a database.json entry; ValueError/TypeError if its amount isn't a number."""
+        amount = d.get("amount")
+        currency = d.get("currency")
+        dt = d.get("datetime")
+        r = cls(
+            dt_to_minutes(dt),
+            int(amount or 0),
+            _CURRENCIES.get(currency),
+            _intern(d.get("user")),
+            d.get("user_id"),
+            _intern(d.get("account")),
+            _intern(d.get("duration")),
+            _intern(d.get("until")),
+            _intern(d.get("method")),
+            d.get("message_id"),
+            _intern(d.get("source")),
+        )
+        if type(amount) is not int or (currency is not None and r.currency is None) \
+                or (dt is not None and r.ts is None) or not FIELDS.issuperset(d):
+            r.raw = {k: v for k, v in d.items() if k not in FIELDS}
+            if type(amount) is not int:
+                r.raw["amount"] = amount
+            if currency is not None and r.currency is None:
+                r.raw["currency"] = _intern(currency)
+            if dt is not None and r.ts is None:
+                r.raw["datetime"] = dt
+        return r
+
+    @property
+    def datetime(self):
+        return minutes_to_dt(self.ts) if self.ts is not None else None
+
+    @property
+    def currency_name(self):
+        if self.currency is not None:
+            return self.currency.name
+        return self.raw.get("currency") if self.raw else None
+
+    def to_dict(self):
+        d = {
+            "user": self.user,
+            "user_id": self.user_id,
+            "account": self.account,
+            "duration": self.duration,
+            "until": self.until,
+            "method": self.method,
+            "amount": self.amount,
+            "currency": self.currency_name,
+            "datetime": self.datetime,
+            "message_id": self.message_id,
+            "source": self.source,
+        }
+        if self.raw:
+            d.update(self.raw)
+        return d
+
+    def __repr__(self):
+        return f"Record({self.to_dict()!r})"
@@ -0,0 +1,194 @@
+# sqlite_store.py
+
+import sqlite3
+import sys
+import threading
+from datetime import date, datetime
+from itertools import groupby
+from operator import itemgetter
+
+from config import DB_PATH, SQLITE_PATH
+from daytree import scan_extremes
+from record import Record, dt_to_minutes
+from store import RecordStore, day_from_number, day_number, minutes_ceil
+
+FIELDS = ("user", "user_id", "account", "duration", "until", "method",
+          "amount", "currency", "datetime", "message_id", "source")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    user TEXT,
+    user_id INTEGER,
+    account TEXT,
+    duration TEXT,
+    until TEXT,
+    method TEXT,
+    amount INTEGER,
+    currency TEXT,
+    datetime TEXT,
+    ts INTEGER,           -- minutes since 1970-01-01, see record.dt_to_minutes
+    message_id INTEGER,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS records_ts ON records (ts);
+CREATE INDEX IF NOT EXISTS records_user_id ON records (user_id);
+CREATE INDEX IF NOT EXISTS records_message_id ON records (message_id);
+"""
+
+SUMS = ("SUM(CASE WHEN currency = 'RUB' THEN COALESCE(amount, 0) ELSE 0 END), "
+        "SUM(CASE WHEN currency = 'UAH' THEN COALESCE(amount, 0) ELSE 0 END)")
+
+INSERT = (f"INSERT INTO records ({', '.join(FIELDS)}, ts) "
+          f"VALUES ({', '.join('?' * (len(FIELDS) + 1))})")
+
+
+def _row(record):
+    return tuple(record.get(k) for k in FIELDS) + (dt_to_minutes(record.get("datetime")),)
+
+
+class SqliteStore:
+    """SQLite backend with the same query methods as store.RecordStore.
+
+    Filtering and aggregation run inside SQLite (indexes on ts, user_id and
+    message_id), so nothing is loaded into memory up front. The database is
+    opened in WAL mode, which lets the parser write while the API reads.
+    """
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        # same role as RecordStore.lock (SQLite does its own locking for the queries)
+        self.lock = threading.RLock()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _records(self, where="", params=()):
+        sql = f"SELECT {', '.join(FIELDS)} FROM records {where}"
+        return [Record.from_dict(dict(r)) for r in self._conn().execute(sql, params)]
+
+    def refresh(self, force=False):
+        # every query reads the database directly, nothing to reload
+        return False
+
+    @property
+    def version(self):
+        # rows are only ever inserted, so the last id identifies the data
+        return self.position()
+
+    def append(self, new_records, index=True):
+        # `index` is for RecordStore's in-memory index; the table's own indexes are kept by sqlite
+        if not new_records:
+            return
+        with self._conn() as conn:
+            conn.executemany(INSERT, [_row(r) for r in new_records])
+
+    def compact(self):
+        # nothing to merge: inserts go straight into the table
+        return False
+
+    def position(self):
+        return self._conn().execute("SELECT COALESCE(MAX(id), 0) FROM records").fetchone()[0]
+
+    def records_with_position(self):
+        position = self.position()
+        # in records() order
+        return self._records("WHERE id <= ? ORDER BY ts IS NOT NULL, ts, id", (position,)), position
+
+    def records_after(self, position):
+        if not isinstance(position, int):
+            return None
+        return self._records("WHERE id > ? ORDER BY id", (position,))
+
+    def tail_after(self, position):
+        if not isinstance(position, int):
+            return None
+        rows = self._conn().execute(f"SELECT id, {', '.join(FIELDS)} FROM records "
+                                    "WHERE id > ? ORDER BY id", (position,)).fetchall()
+        records = [Record.from_dict(dict(r)) for r in rows]
+        return records, (rows[-1]["id"] if rows else position)
+
+    def records(self):
+        return self._records("ORDER BY ts IS NOT NULL, ts, id")
+
+    def range(self, start: datetime, end: datetime):
+        return self._records("WHERE ts >= ? AND ts < ? ORDER BY ts, id",
+                             (minutes_ceil(start), minutes_ceil(end)))
+
+    def range_totals(self, start: datetime, end: datetime):
+        row = self._conn().execute(f"SELECT {SUMS} FROM records WHERE ts >= ? AND ts < ?",
+                                   (minutes_ceil(start), minutes_ceil(end))).fetchone()
+        return row[0] or 0, row[1] or 0
+
+    def daily_totals(self, start_date: date, end_date: date):
+        rows = self._conn().execute(
+            f"SELECT ts / 1440, {SUMS} FROM records WHERE ts >= ? AND ts < ? GROUP BY ts / 1440",
+            (day_number(start_date) * 1440, (day_number(end_date) + 1) * 1440))
+        return {day_from_number(d): (rub, uah) for d, rub, uah in rows}
+
+    def day_extremes(self, start_date: date, end_date: date):
+        return scan_extremes(sorted(self.daily_totals(start_date, end_date).items()))
+
+    def totals(self):
+        row = self._conn().execute(f"SELECT {SUMS} FROM records").fetchone()
+        return row[0] or 0, row[1] or 0
+
+    def user_entries(self, user_id):
+        conn = self._conn()
+        row = conn.execute("SELECT user FROM records WHERE user_id = ? AND user IS NOT NULL "
+                           "AND user != '' ORDER BY COALESCE(ts, 0), id LIMIT 1", (user_id,)).fetchone()
+        entries = self._records("WHERE user_id = ? AND ts IS NOT NULL ORDER BY ts, id", (user_id,))
+        return (row[0] if row else None), entries
+
+    def user_ids(self):
+        rows = self._conn().execute("SELECT DISTINCT user_id FROM records "
+                                    "WHERE user_id IS NOT NULL ORDER BY user_id")
+        return [r[0] for r in rows]
+
+    def user_timestamps(self, last_n=None):
+        conn = self._conn()
+        # name of each user's earliest named record, as in user_entries
+        names = dict(conn.execute(
+            "SELECT user_id, user FROM (SELECT user_id, user, ROW_NUMBER() OVER ("
+            "PARTITION BY user_id ORDER BY COALESCE(ts, 0), id) AS n FROM records "
+            "WHERE user IS NOT NULL AND user != '') WHERE n = 1").fetchall())
+        result = []
+        rows = conn.execute("SELECT user_id, ts FROM records WHERE user_id IS NOT NULL "
+                            "ORDER BY user_id, ts IS NOT NULL, ts, id")
+        for uid, group in groupby(rows, key=itemgetter(0)):
+            ts = [t for _, t in group if t is not None]
+            result.append((uid, names.get(uid), ts[-last_n:] if last_n else ts))
+        return result
+
+    def user_totals(self):
+        rows = self._conn().execute(
+            f"SELECT user_id, COALESCE(NULLIF(user, ''), 'без username') AS name, {SUMS}, COUNT(*) "
+            # by (ts or 0, id) of each one's earliest record, as RecordStore.user_totals
+            "FROM records GROUP BY user_id, name ORDER BY MIN(COALESCE(ts, 0) * 4294967296 + id)")
+        return [tuple(r) for r in rows]
+
+
+def migrate(json_path=DB_PATH, sqlite_path=SQLITE_PATH):
+    """Import database.json (plus its unmerged log) into SQLite, replacing the table."""
+    records = RecordStore(json_path).records()
+    store = SqliteStore(sqlite_path)
+    with store._conn() as conn:
+        conn.execute("DELETE FROM records")
+        conn.executemany(INSERT, [_row(r.to_dict()) for r in records])
+    print(f"💾 Импортировано {len(records)} записей из {json_path} в {sqlite_path}")
+
+
+if __name__ == "__main__":
+    # python sqlite_store.py migrate [database.json] [database.sqlite3]
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrate":
+        migrate(*sys.argv[2:4])
+    else:
+        print("Использование: python sqlite_store.py migrate [database.json] [database.sqlite3]")
@@ -1,13 +1,73 @@
 # stats.py
 
-import json
+import heapq
 from datetime import datetime, date, timedelta
-from config import USD_RUB, USD_UAH
+from operator import itemgetter
+from config import PROFILE_LAST_N, STATS_ENGINE, USD_RUB, USD_UAH
+from profiles import get_profiles
+from record import dt_to_minutes, minute_hour, minute_weekday
+from store import RecordStore, get_store
 
+try:
+    import engine_numpy
+except ImportError:
+    engine_numpy = None
 
-def load_data(path="database.json"):
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+_engines = {}
+# {id(store): store.version} as of the end of the last refresh(), profiles synced too
+_refreshed = {}
+
+
+def load_data(path=None):
+    """All records from the configured store (see store.get_store)."""
+    return get_store(path).records()
+
+
+def _engine():
+    """Where aggregations run: the store itself, or NumpyEngine over it.
+
+    config.STATS_ENGINE = "numpy" applies to the json backend only (sqlite
+    aggregates in SQL) and falls back to pure Python without NumPy.
+    """
+    store = get_store()
+    if STATS_ENGINE != "numpy" or not isinstance(store, RecordStore):
+        return store
+    if engine_numpy is None:
+        if not _engines:
+            print("⚠️ NumPy не установлен, статистика считается без него")
+            _engines[None] = store
+        return store
+    engine = _engines.get(id(store))
+    if engine is None:
+        engine = _engines[id(store)] = engine_numpy.NumpyEngine(store)
+    return engine
+
+
+def data_version():
+    """Changes whenever the data behind every stats function may have changed.
+
+    With background_refresh, the version refresh() published: store.version
+    moves before the profiles are synced, and a result computed in between
+    must not be cached as the new version's.
+    """
+    store = get_store()
+    if getattr(store, "background_refresh", False):
+        return _refreshed.get(id(store), store.version)
+    store.refresh()
+    return store.version
+
+
+def refresh():
+    """Load what was written since the last call into the store and the user profiles.
+
+    For stores with background_refresh set, whose reads don't do it themselves.
+    """
+    store = get_store()
+    store.refresh(force=True)
+    version = store.version
+    get_profiles().sync(store)
+    _refreshed[id(store)] = version
+    return version
 
 
 def parse_dt(s: str):
@@ -31,30 +91,15 @@ def convert_to_rub(amount: float, currency: str) -> float:
     return amount
 
 
-def get_stats(start: datetime, end: datetime):
-    """Возвращает суммарный доход в рублях, гривнах и в долларах (≈) за период."""
-    data = load_data()
-    total_rub = 0
-    total_uah = 0
-
-    for entry in data:
-        if not entry.get("datetime"):
-            continue
-        dt = parse_dt(entry["datetime"])
-        # treat `end` as exclusive (start <= dt < end)
-        if start <= dt < end:
-            if entry["currency"] == "RUB":
-                total_rub += entry["amount"]
-            elif entry["currency"] == "UAH":
-                total_uah += entry["amount"]
+def _totals(rub, uah):
+    return {"rub": rub, "uah": uah, "usd": round(rub / USD_RUB + uah / USD_UAH, 2)}
 
-    total_usd = round(total_rub / USD_RUB + total_uah / USD_UAH, 2)
 
-    return {
-        "rub": total_rub,
-        "uah": total_uah,
-        "usd": total_usd,
-    }
+def get_stats(start: datetime, end: datetime):
+    """Возвращает суммарный доход в рублях, гривнах и в долларах (≈) за период."""
+    # treat `end` as exclusive (start <= dt < end)
+    total_rub, total_uah = _engine().range_totals(start, end)
+    return _totals(total_rub, total_uah)
 
 
 def total_all():
@@ -62,17 +107,8 @@ def total_all():
 
     Результат: {rub: int, uah: int, usd: float}
     """
-    data = load_data()
-    total_rub = 0
-    total_uah = 0
-    for entry in data:
-        if entry.get("currency") == "RUB":
-            total_rub += entry.get("amount", 0)
-        elif entry.get("currency") == "UAH":
-            total_uah += entry.get("amount", 0)
-
-    total_usd = round(total_rub / USD_RUB + total_uah / USD_UAH, 2)
-    return {"rub": total_rub, "uah": total_uah, "usd": total_usd}
+    total_rub, total_uah = _engine().totals()
+    return _totals(total_rub, total_uah)
 
 
 def daily_income(target_date: date):
@@ -84,16 +120,29 @@ def daily_income(target_date: date):
 
 
 def income_by_days(start_date: date, end_date: date):
-    """Возвращает словарь date->stats для каждого дня в диапазоне [start_date, end_date]."""
+    """Возвращает словарь date->stats для каждого дня в диапазоне [start_date, end_date].
+
+    Per-day sums come straight from the store's daily prefix table, days
+    without rentals are filled with zeros.
+    """
+    by_day = _engine().daily_totals(start_date, end_date)
     result = {}
     cur = start_date
     while cur <= end_date:
-        result[cur.isoformat()] = daily_income(cur)
+        rub, uah = by_day.get(cur, (0, 0))
+        result[cur.isoformat()] = _totals(rub, uah)
         cur = cur + timedelta(days=1)
     return result
 
 
-def extremes_by_days(start_date: date, end_date: date):
+def _day_record(day, rub, uah):
+    # rub equivalent
+    rub_eq = rub + convert_to_rub(uah, 'UAH')
+    return {"date": day.isoformat(), "rub": rub, "uah": uah, "rub_eq": round(rub_eq, 2),
+            "usd": round(convert_to_usd(rub_eq, 'RUB'), 2)}
+
+
+def extremes_by_days(start_date: date, end_date: date, top_k: int = None):
     """Return the best and worst day (by rub-equivalent) in given inclusive range.
 
     Excludes days with zero total (rub + uah == 0). Returns dict:
@@ -101,31 +150,34 @@ def extremes_by_days(start_date: date, end_date: date):
      "worst": {...},
      "combined": {"rub": rsum, "uah": usum, "usd": dsum}}
     If no non-zero days found, returns {"best": None, "worst": None, "combined": {rub:0,uah:0,usd:0}}
-    """
-    days = income_by_days(start_date, end_date)
-    best = None
-    worst = None
-    for iso, stats_day in days.items():
-        r = stats_day.get('rub', 0) or 0
-        u = stats_day.get('uah', 0) or 0
-        # rub equivalent
-        rub_eq = r + convert_to_rub(u, 'UAH')
-        if (r == 0 and u == 0):
-            continue
-        rec = {"date": iso, "rub": r, "uah": u, "rub_eq": round(rub_eq, 2), "usd": round(convert_to_usd(rub_eq, 'RUB'), 2)}
-        if best is None or rec['rub_eq'] > best['rub_eq']:
-            best = rec
-        if worst is None or rec['rub_eq'] < worst['rub_eq']:
-            worst = rec
+    With top_k, "top_best" and "top_worst" list the k best and k worst days as well.
 
-    if not best:
-        return {"best": None, "worst": None, "combined": {"rub": 0, "uah": 0, "usd": 0}}
-
-    combined_rub = best['rub'] + worst['rub']
-    combined_uah = best['uah'] + worst['uah']
-    combined_rub_eq = best['rub_eq'] + worst['rub_eq']
-    combined_usd = round(convert_to_usd(combined_rub_eq, 'RUB'), 2)
-    return {"best": best, "worst": worst, "combined": {"rub": combined_rub, "uah": combined_uah, "usd": combined_usd}}
+    best and worst come from the store's day_extremes (a segment tree over
+    the daily totals on json), so the cost does not grow with the range;
+    ties go to the earliest day. top_k reads the days that have records.
+    """
+    ext = _engine().day_extremes(start_date, end_date)
+    if ext is None:
+        res = {"best": None, "worst": None, "combined": {"rub": 0, "uah": 0, "usd": 0}}
+    else:
+        best = _day_record(*ext[0])
+        worst = _day_record(*ext[1])
+        combined_rub = best['rub'] + worst['rub']
+        combined_uah = best['uah'] + worst['uah']
+        combined_rub_eq = best['rub_eq'] + worst['rub_eq']
+        combined_usd = round(convert_to_usd(combined_rub_eq, 'RUB'), 2)
+        res = {"best": best, "worst": worst, "combined": {"rub": combined_rub, "uah": combined_uah, "usd": combined_usd}}
+    if top_k:
+        days = [_day_record(day, r, u) for day, (r, u)
+                in sorted(_engine().daily_totals(start_date, end_date).items()) if r or u]
+        res["top_best"] = heapq.nlargest(top_k, days, key=itemgetter('rub_eq'))
+        res["top_worst"] = heapq.nsmallest(top_k, days, key=itemgetter('rub_eq'))
+    return res
+
+
+def user_ids():
+    """Sorted distinct user_ids in the database."""
+    return get_store().user_ids()
 
 
 def user_summary(user_id):
@@ -135,34 +187,23 @@ def user_summary(user_id):
     {"user": name, "user_id": id, "entries": [ {datetime, account, amount, currency, source}... ],
      "by_hour": {hour: count}, "by_weekday": {0:count..6:count}, "common_hours": [hour,...] }
     """
-    data = load_data()
+    # the store keeps a per-user index, so this touches only this user's records
+    name, records = get_store().user_entries(user_id)
     entries = []
-    name = None
-    for e in data:
-        if e.get('user_id') == user_id:
-            if not name:
-                name = e.get('user')
-            if e.get('datetime'):
-                entries.append({
-                    'datetime': e.get('datetime'),
-                    'account': e.get('account'),
-                    'amount': e.get('amount'),
-                    'currency': e.get('currency'),
-                    'source': e.get('source'),
-                })
-
-    # compute stats
+    for e in records:
+        entries.append({
+            'datetime': e.datetime,
+            'account': e.account,
+            'amount': e.amount,
+            'currency': e.currency_name,
+            'source': e.source,
+        })
+
+    # histograms come from the user's profile, kept up to date as records arrive
     from collections import Counter
-    hours = Counter()
-    weekdays = Counter()
-    from datetime import datetime
-    for ent in entries:
-        try:
-            dt = datetime.strptime(ent['datetime'], '%Y-%m-%d %H:%M')
-            hours[dt.hour] += 1
-            weekdays[dt.weekday()] += 1
-        except Exception:
-            continue
+    profile = get_profiles().get(user_id)
+    hours = Counter(profile.by_hour() if profile else {})
+    weekdays = Counter(profile.by_weekday() if profile else {})
 
     # most common hours (top 3)
     common_hours = [h for h,c in hours.most_common(3)]
@@ -170,13 +211,103 @@ def user_summary(user_id):
     return {
         'user': name or 'без username',
         'user_id': user_id,
-        'entries': sorted(entries, key=lambda x: x['datetime']),
+        'entries': entries,
         'by_hour': dict(hours),
         'by_weekday': dict(weekdays),
         'common_hours': common_hours,
     }
 
 
+def _hour_histograms(minutes):
+    """(Counter hour -> count, {weekday: Counter hour -> count}) for minute timestamps."""
+    from collections import Counter, defaultdict
+
+    global_hours = Counter()
+    weekday_hours = defaultdict(Counter)
+    for m in minutes:
+        h = minute_hour(m)
+        global_hours[h] += 1
+        weekday_hours[minute_weekday(m)][h] += 1
+    return global_hours, weekday_hours
+
+
+def _hour_order(counter, smoothing, alpha):
+    """Hours of `counter`, most frequent first."""
+    if smoothing and counter:
+        # apply smoothing (flatten peaks) via exponent alpha
+        weights = {h: (cnt ** alpha) for h, cnt in counter.items()}
+        return sorted(weights.keys(), key=lambda hh: weights[hh], reverse=True)
+    return [h for h, _ in counter.most_common()]
+
+
+def _is_sleep_hour(h, sleep_start, sleep_end):
+    if sleep_start <= sleep_end:
+        return sleep_start <= h < sleep_end
+    # wrap-around (e.g., sleep_start=22 sleep_end=6)
+    return h >= sleep_start or h < sleep_end
+
+
+def _choose_hours(week_hours, global_order, reminders_per_day, sleep_start, sleep_end):
+    """Pick reminder hours for one day: weekday-specific popular hours first, then global ones."""
+    chosen = []
+    # merge: try week_hours first, then global_order
+    candidates = week_hours + [h for h in global_order if h not in week_hours]
+    for h in candidates:
+        if len(chosen) >= reminders_per_day:
+            break
+        if _is_sleep_hour(h, sleep_start, sleep_end):
+            continue
+        if h not in chosen:
+            # avoid choosing adjacent hours for spread
+            too_close = any(abs(h - c) <= 1 for c in chosen)
+            if not too_close:
+                chosen.append(h)
+
+    # if still not enough, fill with next best non-sleep hours
+    for h in range(24):
+        if len(chosen) >= reminders_per_day:
+            break
+        if h in chosen or _is_sleep_hour(h, sleep_start, sleep_end):
+            continue
+        chosen.append(h)
+    return chosen
+
+
+def _tz_shift(tz_offset):
+    # apply timezone offset (hours) to align times to target timezone
+    try:
+        return int(tz_offset or 0) * 60
+    except Exception:
+        return 0
+
+
+def _hour_orders(minutes, smoothing, alpha):
+    """(hours, {weekday: hours}) for minute timestamps, each list most frequent first."""
+    global_hours, weekday_hours = _hour_histograms(minutes)
+    return (_hour_order(global_hours, smoothing, alpha),
+            {wd: _hour_order(c, smoothing, alpha) for wd, c in weekday_hours.items()})
+
+
+def _profile_orders(profile, last_n, shift, smoothing, alpha):
+    """_hour_orders over the profile's last `last_n` timestamps, cached until it changes."""
+    key = (last_n, shift, smoothing, alpha)
+    orders = profile.cache.get(key)
+    if orders is None:
+        if len(profile.cache) >= 8:
+            profile.cache.clear()
+        minutes = profile.recent[-last_n:] if last_n else profile.recent
+        orders = profile.cache[key] = _hour_orders((m + shift for m in minutes), smoothing, alpha)
+    return orders
+
+
+def _reminders(name, orders, day, reminders_per_day, sleep_start, sleep_end):
+    global_order, week_orders = orders
+    chosen = _choose_hours(week_orders.get(day.weekday(), []), global_order,
+                           reminders_per_day, sleep_start, sleep_end)
+    return [{'date': day.isoformat(), 'time': f"{h:02d}:00", 'note': f"Напомнить {name} взять аренду"}
+            for h in chosen]
+
+
 def generate_reminders_from_summary(summary, days=7, last_n=None, reminders_per_day=1,
                                     tz_offset=0, sleep_start=0, sleep_end=6, smoothing=True, alpha=0.8):
     """Generate reminder suggestions based on user summary.
@@ -188,9 +319,6 @@ def generate_reminders_from_summary(summary, days=7, last_n=None, reminders_per_
 
     Returns list of {date, time, note}
     """
-    from datetime import date, timedelta, datetime
-    from collections import Counter, defaultdict
-
     entries = summary.get('entries', [])
     if last_n and len(entries) > last_n:
         entries = entries[-last_n:]
@@ -199,148 +327,119 @@ def generate_reminders_from_summary(summary, days=7, last_n=None, reminders_per_
         return []
 
     # Build global hour frequencies and weekday->hour frequencies
-    global_hours = Counter()
-    weekday_hours = defaultdict(Counter)
-    for e in entries:
-        try:
-            dt = datetime.strptime(e['datetime'], '%Y-%m-%d %H:%M')
-        except Exception:
-            continue
-        # apply timezone offset (hours) to align times to target timezone
-        try:
-            if tz_offset:
-                dt = dt + timedelta(hours=int(tz_offset))
-        except Exception:
-            pass
-        h = dt.hour
-        wd = dt.weekday()
-        global_hours[h] += 1
-        weekday_hours[wd][h] += 1
-
-    # Prepare sorted lists
-    # Prepare weighted order; apply smoothing (flatten peaks) via exponent alpha
-    if smoothing and global_hours:
-        # compute weights
-        weights = {h: (cnt ** alpha) for h, cnt in global_hours.items()}
-        # sort by weight desc
-        global_order = sorted(weights.keys(), key=lambda hh: weights[hh], reverse=True)
-    else:
-        global_order = [h for h,_ in global_hours.most_common()]
+    shift = _tz_shift(tz_offset)
+    minutes = (dt_to_minutes(e.get('datetime')) for e in entries)
+    orders = _hour_orders((m + shift for m in minutes if m is not None), smoothing, alpha)
 
     today = date.today()
     todo = []
     # For each future day, choose reminders_per_day hours
     for i in range(days):
-        d = today + timedelta(days=i)
-        wd = d.weekday()
-        chosen = []
-        # first try weekday-specific popular hours
-        week_counter = weekday_hours.get(wd, Counter())
-        if smoothing and week_counter:
-            week_weights = {h: (cnt ** alpha) for h, cnt in week_counter.items()}
-            week_hours = sorted(week_weights.keys(), key=lambda hh: week_weights[hh], reverse=True)
-        else:
-            week_hours = [h for h,_ in week_counter.most_common()]
-        # merge: try week_hours first, then global_order
-        candidates = week_hours + [h for h in global_order if h not in week_hours]
-        for h in candidates:
-            if len(chosen) >= reminders_per_day:
-                break
-            # exclude sleep hours
-            if sleep_start <= sleep_end:
-                if sleep_start <= h < sleep_end:
-                    continue
-            else:
-                # wrap-around (e.g., sleep_start=22 sleep_end=6)
-                if h >= sleep_start or h < sleep_end:
-                    continue
-            if h not in chosen:
-                # avoid choosing adjacent hours for spread
-                too_close = any(abs(h - c) <= 1 for c in chosen)
-                if not too_close:
-                    chosen.append(h)
-
-        # if still not enough, fill with next best non-sleep hours
-        for h in range(24):
-            if len(chosen) >= reminders_per_day:
-                break
-            if h in chosen:
-                continue
-            if sleep_start <= sleep_end:
-                if sleep_start <= h < sleep_end:
-                    continue
-            else:
-                if h >= sleep_start or h < sleep_end:
-                    continue
-            chosen.append(h)
-
-        for h in chosen:
-            todo.append({'date': d.isoformat(), 'time': f"{h:02d}:00", 'note': f"Напомнить {summary.get('user')} взять аренду"})
+        todo += _reminders(summary.get('user'), orders, today + timedelta(days=i),
+                           reminders_per_day, sleep_start, sleep_end)
+    return todo
 
+
+def user_reminders(user_id, days=7, last_n=None, reminders_per_day=1, tz_offset=0,
+                   sleep_start=0, sleep_end=6, smoothing=True, alpha=0.8):
+    """generate_reminders_from_summary(user_summary(user_id), ...) read from the user's profile.
+
+    The profile's recent timestamps are enough for last_n <= PROFILE_LAST_N;
+    a longer history comes from the store.
+    """
+    profile = get_profiles().get(user_id)
+    if profile is None or not profile.recent:
+        return []
+    shift = _tz_shift(tz_offset)
+    if last_n and last_n <= PROFILE_LAST_N:
+        orders = _profile_orders(profile, last_n, shift, smoothing, alpha)
+    else:
+        minutes = [r.ts for r in get_store().user_entries(user_id)[1]]
+        orders = _hour_orders((m + shift for m in minutes[-last_n if last_n else 0:]), smoothing, alpha)
+
+    today = date.today()
+    todo = []
+    for i in range(days):
+        todo += _reminders(profile.name or 'без username', orders, today + timedelta(days=i),
+                           reminders_per_day, sleep_start, sleep_end)
     return todo
 
 
+def _orders_batch(users, shift, smoothing, alpha):
+    # runs in-process or in a reminders_for_day worker
+    return [(uid, name, _hour_orders((m + shift for m in minutes), smoothing, alpha))
+            for uid, name, minutes in users if minutes]
+
+
+def reminders_for_day(target: date, last_n=None, reminders_per_day=1, tz_offset=0,
+                      sleep_start=0, sleep_end=6, smoothing=True, alpha=0.8, workers=None):
+    """Reminders on `target` for every user, as [{user, user_id, reminders}] sorted by user_id.
+
+    For last_n <= PROFILE_LAST_N the hour orders come from the user profiles
+    (cached there until the user's next rental). Otherwise every user's
+    timestamps are read from the store in one pass, optionally split across
+    a process pool with workers > 1, which only pays off for tens of
+    thousands of users.
+    """
+    shift = _tz_shift(tz_offset)
+    if last_n and last_n <= PROFILE_LAST_N:
+        users = [(uid, p.name, _profile_orders(p, last_n, shift, smoothing, alpha))
+                 for uid, p in get_profiles().items() if p.recent]
+    else:
+        timestamps = get_store().user_timestamps(last_n)
+        args = (shift, smoothing, alpha)
+        if not workers or workers < 2 or len(timestamps) < 2 * workers:
+            users = _orders_batch(timestamps, *args)
+        else:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # fork: workers need only this module, already imported
+            ctx = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+            size = -(-len(timestamps) // workers)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+                futures = [pool.submit(_orders_batch, timestamps[i:i + size], *args)
+                           for i in range(0, len(timestamps), size)]
+                users = [u for f in futures for u in f.result()]
+
+    result = []
+    for uid, name, orders in users:
+        name = name or 'без username'
+        todo = _reminders(name, orders, target, reminders_per_day, sleep_start, sleep_end)
+        if todo:
+            result.append({'user': name, 'user_id': uid, 'reminders': todo})
+    return result
+
+
 def ranking_by_income(top_n: int = 10):
     """Возвращает топ пользователей по сумме в RUB-эквиваленте.
 
     Результат: список словарей: {user, user_id, total_rub, total_usd, count}
     """
-    data = load_data()
-    users = {}
-
-    for e in data:
-        uid = e.get("user_id")
-        name = e.get("user") or "без username"
-        amt = e.get("amount", 0) or 0
-        cur = e.get("currency", "RUB")
-
-        # keep raw sums by currency; compute rub-equivalent for sorting
-        key = (uid, name)
-        if key not in users:
-            users[key] = {
-                "user": name,
-                "user_id": uid,
-                "total_rub_raw": 0.0,
-                "total_uah_raw": 0.0,
-                "total_rub_eq": 0.0,
-                "count": 0,
-            }
-
-        if cur == "RUB":
-            users[key]["total_rub_raw"] += amt
-        elif cur == "UAH":
-            users[key]["total_uah_raw"] += amt
-
-        # rub-equivalent used for sorting
-        users[key]["total_rub_eq"] += convert_to_rub(amt, cur)
-        users[key]["count"] += 1
-
-    arr = list(users.values())
-    arr.sort(key=lambda x: x["total_rub_eq"], reverse=True)
-    # Round totals for neatness and provide a USD-equivalent computed with server config
-    for a in arr:
-        a["total_rub_raw"] = round(a["total_rub_raw"], 2)
-        a["total_uah_raw"] = round(a["total_uah_raw"], 2)
-        a["total_rub_eq"] = round(a["total_rub_eq"], 2)
-        # USD-equivalent (server-side) provided for convenience
-        a["total_usd_eq"] = round(a["total_rub_eq"] / USD_RUB, 2)
-
-    return arr[:top_n]
+    # per-user sums are kept up to date by the store (GROUP BY on sqlite);
+    # nlargest keeps only top_n of them, ties in order of first appearance like a stable sort
+    top = heapq.nlargest(top_n, _engine().user_totals(),
+                         key=lambda t: t[2] + convert_to_rub(t[3], "UAH"))
+    arr = []
+    for uid, name, rub, uah, count in top:
+        rub_eq = round(rub + convert_to_rub(uah, "UAH"), 2)
+        arr.append({
+            "user": name,
+            "user_id": uid,
+            # Round totals for neatness and provide a USD-equivalent computed with server config
+            "total_rub_raw": round(float(rub), 2),
+            "total_uah_raw": round(float(uah), 2),
+            "total_rub_eq": rub_eq,
+            "count": count,
+            # USD-equivalent (server-side) provided for convenience
+            "total_usd_eq": round(rub_eq / USD_RUB, 2),
+        })
+    return arr
 
 
 def ranking_by_count(top_n: int = 10):
-    data = load_data()
-    users = {}
-    for e in data:
-        uid = e.get("user_id")
-        name = e.get("user") or "без username"
-        key = (uid, name)
-        users.setdefault(key, 0)
-        users[key] += 1
-
-    arr = [{"user": k[1], "user_id": k[0], "count": v} for k, v in users.items()]
-    arr.sort(key=lambda x: x["count"], reverse=True)
-    return arr[:top_n]
+    top = heapq.nlargest(top_n, _engine().user_totals(), key=itemgetter(4))
+    return [{"user": name, "user_id": uid, "count": count} for uid, name, _rub, _uah, count in top]
 
 
 if __name__ == "__main__":
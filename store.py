@@ -0,0 +1,613 @@
+# store.py
+
+import json
+import os
+import tempfile
+import threading
+from bisect import bisect_left, insort
+from datetime import date, datetime
+from operator import attrgetter
+
+from config import DB_PATH, LOG_PATH, SQLITE_PATH, STORAGE_BACKEND
+from columns import Columns, UserCodes
+from daytree import ExtremeTree, day_value
+from record import EPOCH_DAY, Currency, Record
+
+
+def minutes_ceil(dt: datetime):
+    """First whole minute >= dt, so `start <= record < end` can be checked on minutes."""
+    m = (dt.toordinal() - EPOCH_DAY) * 1440 + dt.hour * 60 + dt.minute
+    if dt.second or dt.microsecond:
+        m += 1
+    return m
+
+
+def day_number(d: date):
+    return d.toordinal() - EPOCH_DAY
+
+
+def day_from_number(n):
+    return date.fromordinal(n + EPOCH_DAY)
+
+
+def atomic_write(path, data: bytes):
+    """Replace `path` with `data` so that readers see either the old or the new file.
+
+    The data goes to a temp file in the same directory, is fsynced and then
+    renamed over `path`; a crash at any point leaves the previous file intact.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    # make the rename itself durable (not possible on Windows, skip there)
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+def read_records(entries, unreadable=None, where="базе"):
+    """Records for database.json entries (Records pass through).
+
+    An entry that isn't a valid record (say, an amount of "n/a") is logged
+    and skipped, and kept as is in `unreadable` if that is given.
+    """
+    records = []
+    for d in entries:
+        if isinstance(d, Record):
+            records.append(d)
+            continue
+        try:
+            records.append(Record.from_dict(d))
+        except (ValueError, TypeError, AttributeError) as e:
+            print(f"⚠️ Пропущена запись в {where}: {d!r} ({e})")
+            if unreadable is not None:
+                unreadable.append(d)
+    return records
+
+
+def write_snapshot(records, path=DB_PATH, unreadable=()):
+    """Atomically write records (Record or dict) sorted by datetime, undated ones first.
+
+    `unreadable` entries, and dicts that aren't valid records, are written
+    unchanged before the rest.
+    """
+    unreadable = list(unreadable)
+    records = read_records(records, unreadable)
+    records.sort(key=lambda r: r.ts or 0)
+    data = json.dumps(unreadable + [r.to_dict() for r in records], ensure_ascii=False, indent=2)
+    atomic_write(path, data.encode("utf-8"))
+
+
+_by_ts = attrgetter("ts")
+
+
+def _amounts(r):
+    """(rub, uah) contribution of one record."""
+    if r.currency is Currency.RUB:
+        return r.amount, 0
+    if r.currency is Currency.UAH:
+        return 0, r.amount
+    return 0, 0
+
+
+class _Index:
+    """Lookup structures derived from the records.
+
+    - dated: dated records sorted by minute timestamp
+    - cols: Columns over `dated` (ts for bisect, amount/currency/user for sums)
+    - users: UserCodes, (user_id, name) -> code in order of first appearance
+    - days/cum_rub/cum_uah: days that have records and prefix sums over them,
+      cum_x[i] is the total of days[:i], so any day range is two lookups
+    - extremes: ExtremeTree over `days` by RUB equivalent, for best/worst day queries
+    - undated: {user code: [rub, uah, count]} of records without a usable datetime
+    - by_user: {user_id: that user's dated records in `dated` order}, every
+      user_id seen has an entry, possibly empty
+    - shared_users: user_ids whose by_user list is still shared with the
+      index this one was copied from, copied before it is first changed
+    - names: {user_id: (ts or 0, name)} of the user's earliest record with a
+      non-empty name, the one database.json order puts first
+    - user_rub/user_uah/user_count: per user code totals over all records,
+      kept up to date as records are added
+    - user_first: per user code, (ts or 0, position in `records`) of its
+      earliest record, ties going to the first loaded: where database.json
+      lists the user first once the log is compacted into it (codes follow
+      load order, which puts the log after the snapshot)
+    """
+
+    __slots__ = ("records", "dated", "cols", "users", "days", "cum_rub", "cum_uah", "extremes",
+                 "undated", "by_user", "shared_users", "names", "user_rub", "user_uah", "user_count",
+                 "user_first")
+
+    def __init__(self, records):
+        self.records = records
+        self.dated = []
+        self.cols = Columns()
+        self.users = UserCodes()
+        self.undated = {}
+        self.by_user = {}
+        self.shared_users = set()
+        self.names = {}
+        self.user_rub = []
+        self.user_uah = []
+        self.user_count = []
+        self.user_first = []
+        self.days = []
+        self.cum_rub = [0]
+        self.cum_uah = [0]
+        self.extremes = ExtremeTree()
+        self._add(records)
+
+    def _rebuild_days_from(self, day):
+        """Recompute the daily prefix table for `day` and every later day."""
+        k = bisect_left(self.days, day)
+        del self.days[k:]
+        del self.cum_rub[k + 1:]
+        del self.cum_uah[k + 1:]
+        self.extremes.truncate(k)
+        rub = self.cum_rub[-1]
+        uah = self.cum_uah[-1]
+        cols = self.cols
+        ts = cols.ts
+        i = bisect_left(ts, day * 1440)
+        n = len(ts)
+        while i < n:
+            cur = ts[i] // 1440
+            j = bisect_left(ts, (cur + 1) * 1440, i)
+            r, u = cols.totals(i, j)
+            rub += r
+            uah += u
+            i = j
+            self.days.append(cur)
+            self.cum_rub.append(rub)
+            self.cum_uah.append(uah)
+            self.extremes.append(day_value(r, u))
+
+    def _add(self, new_records):
+        new = []
+        # extend() has already added new_records to self.records
+        first_pos = len(self.records) - len(new_records)
+        for pos, r in enumerate(new_records, first_pos):
+            # code every record here, in input order, so codes follow first appearance
+            code = self.users.code(r)
+            if code == len(self.user_count):
+                self.user_rub.append(0)
+                self.user_uah.append(0)
+                self.user_count.append(0)
+                self.user_first.append((r.ts or 0, pos))
+            elif (r.ts or 0) < self.user_first[code][0]:
+                self.user_first[code] = (r.ts or 0, pos)
+            rub, uah = _amounts(r)
+            self.user_rub[code] += rub
+            self.user_uah[code] += uah
+            self.user_count[code] += 1
+            if r.user_id not in self.by_user:
+                self.by_user[r.user_id] = []
+            if r.user:
+                # as write_snapshot sorts: undated first, equal times keep insertion order
+                name = self.names.get(r.user_id)
+                if name is None or (r.ts or 0) < name[0]:
+                    self.names[r.user_id] = (r.ts or 0, r.user)
+            if r.ts is not None:
+                new.append(r)
+                continue
+            row = self.undated.get(code)
+            if row is None:
+                row = self.undated[code] = [0, 0, 0]
+            row[0] += rub
+            row[1] += uah
+            row[2] += 1
+        if not new:
+            return
+        new.sort(key=_by_ts)
+        for r in new:
+            entries = self.by_user[r.user_id]
+            if r.user_id in self.shared_users:
+                self.shared_users.discard(r.user_id)
+                entries = self.by_user[r.user_id] = entries[:]
+            if not entries or entries[-1].ts <= r.ts:
+                entries.append(r)
+            else:
+                # late record: after existing ones with the same minute, as in `dated`
+                insort(entries, r, key=_by_ts)
+        first = new[0].ts
+        ts = self.cols.ts
+        if ts and first < ts[-1]:
+            # merge with the part of the index the new records overlap;
+            # sorting two sorted runs is a linear merge in timsort
+            k = bisect_left(ts, first + 1)
+            new = self.dated[k:] + new
+            new.sort(key=_by_ts)
+            del self.dated[k:]
+            self.cols.truncate(k)
+        self.dated.extend(new)
+        self.cols.extend(new, self.users)
+        self._rebuild_days_from(first // 1440)
+
+    def copy(self):
+        """An independent index over the same records, to extend while this one is being read."""
+        index = _Index.__new__(_Index)
+        index.records = self.records[:]
+        index.dated = self.dated[:]
+        index.cols = self.cols.copy()
+        index.users = self.users.copy()
+        index.days = self.days[:]
+        index.cum_rub = self.cum_rub[:]
+        index.cum_uah = self.cum_uah[:]
+        index.extremes = self.extremes.copy()
+        index.undated = {code: row[:] for code, row in self.undated.items()}
+        index.by_user = self.by_user.copy()
+        index.shared_users = set(self.by_user)
+        index.names = self.names.copy()
+        index.user_rub = self.user_rub[:]
+        index.user_uah = self.user_uah[:]
+        index.user_count = self.user_count[:]
+        index.user_first = self.user_first[:]
+        return index
+
+    def extend(self, new_records):
+        """Add records, touching only the days from the earliest new one onwards."""
+        self.records.extend(new_records)
+        self._add(new_records)
+
+    def bounds(self, start, end):
+        """Positions in `dated` of start <= datetime < end."""
+        ts = self.cols.ts
+        lo = bisect_left(ts, minutes_ceil(start))
+        return lo, bisect_left(ts, minutes_ceil(end), lo)
+
+    def day(self, k):
+        """(date, rub, uah) of the k-th day in the prefix table."""
+        return (day_from_number(self.days[k]),
+                self.cum_rub[k + 1] - self.cum_rub[k],
+                self.cum_uah[k + 1] - self.cum_uah[k])
+
+    def day_totals(self, first_day, end_day):
+        """(rub, uah) over days first_day <= d < end_day."""
+        i = bisect_left(self.days, first_day)
+        j = bisect_left(self.days, end_day, i)
+        return (self.cum_rub[j] - self.cum_rub[i], self.cum_uah[j] - self.cum_uah[i])
+
+    def undated_totals(self):
+        rub = uah = 0
+        for r, u, _ in self.undated.values():
+            rub += r
+            uah += u
+        return rub, uah
+
+
+class RecordStore:
+    """In-memory copy of the records shared by stats, api, bot and parser.
+
+    On disk the data is a sorted snapshot (database.json) plus an append-only
+    log (records.jsonl) of records added since the last compaction. The
+    snapshot is parsed only when its inode/mtime/size change; growth of the log is
+    read incrementally from the last known offset, so new rentals become
+    visible without re-reading the snapshot.
+    """
+
+    def __init__(self, path=DB_PATH, log_path=LOG_PATH):
+        self.path = path
+        self.log_path = log_path
+        self.version = 0
+        self.background_refresh = False
+        self._index = _Index([])
+        # entries on disk that aren't valid records, written back as they are by compact()
+        self._unreadable = []
+        self._signature = None
+        self._log_ino = None
+        self._log_offset = 0
+        # held by append, compaction and loading; public so callers can group several calls
+        self.lock = threading.RLock()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        # the inode changes on every atomic replace, even within one mtime tick
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _stat_log(self):
+        try:
+            st = os.stat(self.log_path)
+        except FileNotFoundError:
+            return None, 0
+        return st.st_ino, st.st_size
+
+    def _read_log(self, offset, unreadable=None):
+        """Complete lines of the log after `offset` -> (records, new offset, inode).
+
+        Entries that aren't valid records go to `unreadable`, see read_records.
+        """
+        try:
+            with open(self.log_path, "rb") as f:
+                ino = os.fstat(f.fileno()).st_ino
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], 0, None
+        # a line still being written has no trailing newline yet
+        end = data.rfind(b"\n") + 1
+        entries = []
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError as e:
+                print("⚠️ Повреждённая строка в журнале:", e)
+        return read_records(entries, unreadable, "журнале"), offset + end, ino
+
+    def refresh(self, force=False):
+        """Pick up changes on disk. Returns True when anything new was loaded.
+
+        With background_refresh set, the reads' own calls are no-ops and the
+        owner calls refresh(force=True) from elsewhere (api.py does it off
+        the event loop), so queries never touch the disk.
+        """
+        if self.background_refresh and not force:
+            return False
+        sig = self._stat()
+        log_ino, log_size = self._stat_log()
+        if sig == self._signature and log_ino == self._log_ino and log_size == self._log_offset:
+            return False
+        with self.lock:
+            sig = self._stat()
+            log_ino, log_size = self._stat_log()
+            if sig != self._signature or log_ino != self._log_ino or log_size < self._log_offset:
+                return self._reload(sig)
+            if log_size > self._log_offset:
+                records, self._log_offset, _ = self._read_log(self._log_offset, self._unreadable)
+                if records:
+                    self._extend(records)
+                    self.version += 1
+                    return True
+            return False
+
+    def _reload(self, sig):
+        """Full re-read: snapshot plus the whole log (after a compaction or on start)."""
+        unreadable = []
+        if sig is None:
+            records = []
+        else:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    entries = json.load(f)
+            except (OSError, ValueError) as e:
+                # half-written file: keep serving the previous snapshot
+                print("⚠️ Ошибка при чтении базы:", e)
+                return False
+            records = read_records(entries, unreadable)
+        log_records, offset, ino = self._read_log(0, unreadable)
+        # a compaction may have written the snapshot but not yet reset the log
+        in_snapshot = {r.message_id for r in records if r.message_id}
+        records.extend(r for r in log_records if not r.message_id or r.message_id not in in_snapshot)
+        self._index = _Index(records)
+        self._unreadable = unreadable
+        self._signature = sig
+        self._log_ino = ino
+        self._log_offset = offset
+        self.version += 1
+        return True
+
+    def append(self, new_records, index=True):
+        """Append record dicts to the log (one write + fsync) and index them in memory.
+
+        With index=False they are only written; the next refresh reads them
+        back together with everything else appended that way, in one extend.
+        Backfill pages are each older than the whole index, and merging them
+        in one by one would re-sort the index every time.
+        """
+        if not new_records:
+            return
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in new_records).encode("utf-8")
+        with self.lock:
+            if index:
+                self.refresh(force=True)
+            with open(self.log_path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                ino = os.fstat(f.fileno()).st_ino
+            if not index:
+                return
+            self._log_ino = ino
+            self._log_offset += len(data)
+            self._extend([Record.from_dict(r) for r in new_records])
+            self.version += 1
+
+    def _extend(self, records):
+        """Index new records.
+
+        With background_refresh, queries read the index from other threads
+        while this runs, so the records go into a copy that replaces it in
+        one assignment; readers take self._index once and never see it change
+        under them.
+        """
+        if self.background_refresh:
+            index = self._index.copy()
+            index.extend(records)
+            self._index = index
+        else:
+            self._index.extend(records)
+
+    def position(self):
+        """Where the data on disk ends: [snapshot signature, log inode, log size]."""
+        sig = self._stat()
+        log_ino, log_size = self._stat_log()
+        return [list(sig) if sig else None, log_ino, log_size]
+
+    def records_with_position(self):
+        """(records in memory, the position they cover), to be continued with tail_after.
+
+        position() is where the files end now, which can be past the index:
+        records appended after the last refresh, or with append(index=False).
+        """
+        with self.lock:
+            self.refresh()
+            sig = self._signature
+            return self._index.records[:], [list(sig) if sig else None, self._log_ino, self._log_offset]
+
+    def records_after(self, position):
+        """Records appended since `position`, or None if the snapshot was rewritten since."""
+        tail = self.tail_after(position)
+        return tail[0] if tail is not None else None
+
+    def tail_after(self, position):
+        """(records appended since `position`, position right after them), or None like records_after."""
+        sig, log_ino, offset = position
+        cur_sig, cur_ino, cur_size = self.position()
+        # no log at `position` means anything in the current log is new
+        if cur_sig != sig or (log_ino is not None and cur_ino != log_ino) or cur_size < offset:
+            return None
+        records, end, ino = self._read_log(offset)
+        return records, [cur_sig, ino, end]
+
+    def compact(self):
+        """Merge the log into a fresh sorted snapshot and start an empty log."""
+        with self.lock:
+            self.refresh(force=True)
+            if not self._log_offset:
+                return False
+            write_snapshot(self._index.records, self.path, self._unreadable)
+            # replace rather than truncate, so readers notice the new inode
+            atomic_write(self.log_path, b"")
+            self._signature = self._stat()
+            self._log_ino, self._log_offset = self._stat_log()
+            print(f"🗜 Журнал {self.log_path} слит в {self.path}")
+            return True
+
+    def records(self):
+        self.refresh()
+        return self._index.records
+
+    def range(self, start: datetime, end: datetime):
+        """Dated records with start <= datetime < end, found by binary search."""
+        self.refresh()
+        index = self._index
+        lo, hi = index.bounds(start, end)
+        return index.dated[lo:hi]
+
+    def range_totals(self, start: datetime, end: datetime):
+        """(rub, uah) for start <= datetime < end.
+
+        Whole-day bounds are answered from the prefix table; anything else
+        sums the bisected slice of the amount/currency columns.
+        """
+        self.refresh()
+        index = self._index
+        if start.time() == datetime.min.time() and end.time() == datetime.min.time():
+            return index.day_totals(day_number(start.date()), day_number(end.date()))
+        return index.cols.totals(*index.bounds(start, end))
+
+    def daily_totals(self, start_date: date, end_date: date):
+        """{date: (rub, uah)} for days in [start_date, end_date] that have records."""
+        self.refresh()
+        index = self._index
+        i = bisect_left(index.days, day_number(start_date))
+        j = bisect_left(index.days, day_number(end_date) + 1, i)
+        result = {}
+        for k in range(i, j):
+            result[day_from_number(index.days[k])] = (
+                index.cum_rub[k + 1] - index.cum_rub[k],
+                index.cum_uah[k + 1] - index.cum_uah[k],
+            )
+        return result
+
+    def day_extremes(self, start_date: date, end_date: date):
+        """(best, worst) non-empty days in [start_date, end_date] by RUB equivalent.
+
+        Each is (date, rub, uah); None if the range has no such day. Two
+        O(log n) segment tree queries, whatever the length of the range.
+        """
+        self.refresh()
+        index = self._index
+        i = bisect_left(index.days, day_number(start_date))
+        j = bisect_left(index.days, day_number(end_date) + 1, i)
+        best = index.extremes.max(i, j)
+        if best is None:
+            return None
+        return index.day(best), index.day(index.extremes.min(i, j))
+
+    def totals(self):
+        """(rub, uah) over the whole database, undated records included."""
+        self.refresh()
+        index = self._index
+        rub, uah = index.undated_totals()
+        return index.cum_rub[-1] + rub, index.cum_uah[-1] + uah
+
+    def user_entries(self, user_id):
+        """(first non-empty user name, dated records in time order) for one user."""
+        self.refresh()
+        index = self._index
+        return index.names.get(user_id, (0, None))[1], list(index.by_user.get(user_id, ()))
+
+    def user_ids(self):
+        """Sorted distinct user_ids, None excluded."""
+        self.refresh()
+        return sorted(uid for uid in self._index.by_user if uid is not None)
+
+    def user_timestamps(self, last_n=None):
+        """[(user_id, name, minute timestamps in time order)] for every user_id, sorted by id.
+
+        With last_n only each user's last N timestamps are returned.
+        """
+        self.refresh()
+        index = self._index
+        start = -last_n if last_n else 0
+        return [(uid, index.names.get(uid, (0, None))[1], [r.ts for r in index.by_user[uid][start:]])
+                for uid in sorted(uid for uid in index.by_user if uid is not None)]
+
+    def user_totals(self):
+        """[(user_id, name, rub, uah, count)] per (user_id, name), by each one's earliest record.
+
+        That is the order of first appearance in database.json, which the
+        rankings list ties in, also while new records are still in the log.
+        The per-user sums are maintained as records are indexed, so this is
+        O(users log users).
+        """
+        self.refresh()
+        index = self._index
+        keys = index.users.keys
+        return [(*keys[c], index.user_rub[c], index.user_uah[c], index.user_count[c])
+                for c in sorted(range(len(keys)), key=index.user_first.__getitem__)]
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path=None):
+    """Return the process-wide store (created on first use).
+
+    config.STORAGE_BACKEND picks the backend: "json" keeps database.json
+    in memory, "sqlite" queries SQLITE_PATH directly.
+    """
+    if STORAGE_BACKEND == "sqlite":
+        from sqlite_store import SqliteStore
+        factory, path = SqliteStore, path or SQLITE_PATH
+    else:
+        factory, path = RecordStore, path or DB_PATH
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = factory(path)
+        return store
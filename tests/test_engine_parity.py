@@ -0,0 +1,128 @@
+"""NumpyEngine against RecordStore, and both against plain sums over the records."""
+
+import json
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from engine_numpy import NumpyEngine
+from store import RecordStore, write_snapshot
+
+START = datetime(2025, 3, 1)
+DAYS = 40
+
+
+def generate(seed, n=600):
+    """Record dicts spread over DAYS days: some undated, currencies RUB/UAH/other/missing."""
+    rnd = random.Random(seed)
+    records = []
+    for i in range(n):
+        when = START + timedelta(minutes=rnd.randrange(DAYS * 1440))
+        records.append({
+            "user": f"user{rnd.randrange(30)}",
+            "user_id": 1000 + rnd.randrange(30),
+            "account": f"{rnd.randrange(40):03d}",
+            "amount": rnd.randrange(1, 2000),
+            "currency": rnd.choice(["RUB", "RUB", "UAH", "UAH", "USD", None]),
+            "datetime": rnd.choice([when.strftime("%Y-%m-%d %H:%M")] * 8 + [None, "", "вчера"]),
+            "message_id": i + 1,
+        })
+    return records
+
+
+@pytest.fixture(params=[1, 2, 3])
+def data(request, tmp_path):
+    """(RecordStore, the record dicts it holds)."""
+    records = generate(request.param)
+    # most records in the snapshot, the rest appended to the log out of time order
+    cut = len(records) * 3 // 4
+    write_snapshot(records[:cut], str(tmp_path / "database.json"))
+    store = RecordStore(str(tmp_path / "database.json"), str(tmp_path / "records.jsonl"))
+    store.append(records[cut:])
+    return store, records
+
+
+def expected(records, start=None, end=None):
+    """(rub, uah) summed over record dicts, all of them or those with start <= datetime < end."""
+    rub = uah = 0
+    for r in records:
+        if start is not None:
+            try:
+                when = datetime.strptime(r["datetime"] or "", "%Y-%m-%d %H:%M")
+            except ValueError:
+                continue
+            if not start <= when < end:
+                continue
+        if r["currency"] == "RUB":
+            rub += r["amount"]
+        elif r["currency"] == "UAH":
+            uah += r["amount"]
+    return rub, uah
+
+
+def test_totals(data):
+    store, records = data
+    assert store.totals() == NumpyEngine(store).totals() == expected(records)
+
+
+@pytest.mark.parametrize("start, end", [
+    (START, START + timedelta(days=DAYS)),
+    (START + timedelta(days=3), START + timedelta(days=4)),
+    (START + timedelta(days=2, hours=7, minutes=13), START + timedelta(days=9, hours=1)),
+    (START + timedelta(hours=23, minutes=59), START + timedelta(days=1, minutes=1)),
+    (START + timedelta(days=5, seconds=30), START + timedelta(days=5, minutes=45, seconds=1)),
+    # empty: nothing in range, zero length, before and after the data
+    (START + timedelta(days=6, hours=5), START + timedelta(days=6, hours=5)),
+    (datetime(2020, 1, 1), datetime(2020, 2, 1, 12, 30)),
+    (START + timedelta(days=DAYS + 1), START + timedelta(days=DAYS + 30)),
+])
+def test_range_totals(data, start, end):
+    store, records = data
+    assert store.range_totals(start, end) == NumpyEngine(store).range_totals(start, end) \
+        == expected(records, start, end)
+
+
+@pytest.mark.parametrize("first, last", [
+    (date(2025, 2, 20), date(2025, 5, 1)),
+    (date(2025, 3, 10), date(2025, 3, 10)),
+    (date(2025, 3, 5), date(2025, 3, 21)),
+    (date(2020, 1, 1), date(2020, 12, 31)),
+    (date(2025, 3, 10), date(2025, 3, 9)),
+])
+def test_daily_totals(data, first, last):
+    store, records = data
+    # every day with a dated record, whatever its currency
+    days = {datetime.strptime(r["datetime"], "%Y-%m-%d %H:%M").date()
+            for r in records if r["datetime"] and r["datetime"][0].isdigit()}
+    want = {}
+    for day in sorted(d for d in days if first <= d <= last):
+        start = datetime.combine(day, datetime.min.time())
+        want[day] = expected(records, start, start + timedelta(days=1))
+    assert store.daily_totals(first, last) == NumpyEngine(store).daily_totals(first, last) == want
+
+
+def test_engine_follows_appends(data):
+    store, _ = data
+    engine = NumpyEngine(store)
+    before = engine.totals()
+    store.append([{"user": "late", "user_id": 1, "amount": 77, "currency": "UAH",
+                   "datetime": "2025-03-02 10:00", "message_id": 10 ** 6}])
+    assert engine.totals() == (before[0], before[1] + 77) == store.totals()
+    day = date(2025, 3, 2)
+    assert engine.daily_totals(day, day) == store.daily_totals(day, day)
+
+
+def test_after_compaction(data):
+    store, records = data
+    store.compact()
+    with open(store.path, encoding="utf-8") as f:
+        saved = {e["message_id"]: e for e in json.load(f)}
+    # nothing lost in the rewrite: other currencies, unparsable datetimes included
+    assert [{k: saved[r["message_id"]][k] for k in r} for r in records] == records
+    engine = NumpyEngine(RecordStore(store.path, store.log_path))
+    first, last = date(2025, 3, 1), date(2025, 4, 30)
+    assert engine.totals() == store.totals()
+    assert engine.daily_totals(first, last) == store.daily_totals(first, last)
@@ -0,0 +1,80 @@
+"""parser.run_live against bench.FakeClient, in a temporary data directory."""
+
+import asyncio
+import importlib
+import json
+from datetime import date, datetime
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("telethon")
+
+DAY = date(2026, 2, 3)
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    """(parser, stats) working on empty data files in tmp_path."""
+    # config paths are relative: everything, parser's session file included, lands in tmp_path
+    monkeypatch.chdir(tmp_path)
+    parser = importlib.import_module("parser")
+    import profiles
+    import stats
+    import store
+
+    monkeypatch.setattr(store, "_stores", {})
+    monkeypatch.setattr(parser, "_dedup", None)
+    monkeypatch.setattr(profiles, "_profiles", None)
+    monkeypatch.setattr(stats, "_engines", {})
+    return parser, stats
+
+
+def test_live_post_is_stored_and_catch_up_skips_it(env, tmp_path):
+    from bench import FakeClient, message_text, sample_record
+
+    parser, stats = env
+    record = sample_record(7, datetime.combine(DAY, datetime.min.time()).replace(hour=14, minute=5))
+
+    async def scenario():
+        fake = FakeClient()
+        # something that isn't a rental, posted before the parser starts
+        fake.messages.append(SimpleNamespace(id=1, text="привет", date=datetime.now()))
+        task = asyncio.create_task(parser.run_live(fake, catchup_interval=3600))
+        await fake.connected.wait()
+        await asyncio.sleep(0)
+        assert parser.load_state()["last_message_id"] == 1
+
+        msg = await fake.post(message_text(record))
+        # the handler stored it while the post was delivered, before any catch-up poll
+        income = stats.daily_income(DAY)
+        assert (income["rub"], income["uah"]) == (0, record["amount"])
+
+        # the catch-up poll sees the same message again: no second record, watermark moves on
+        await parser._fetch(fake, 100, parser.last_seen_id())
+        assert stats.daily_income(DAY) == income
+        task.cancel()
+        return msg.id
+
+    msg_id = asyncio.run(scenario())
+    with open(tmp_path / "parser_state.json", encoding="utf-8") as f:
+        assert json.load(f)["last_message_id"] == msg_id
+    records = parser.get_store().records()
+    assert [(r.message_id, r.amount, r.currency_name) for r in records] \
+        == [(msg_id, record["amount"], record["currency"])]
+
+
+def test_first_poll_starts_from_the_newest_messages(env, tmp_path):
+    from bench import FakeClient, message_text, sample_record
+
+    parser, _ = env
+    fake = FakeClient()
+    when = datetime.combine(DAY, datetime.min.time())
+    for i in range(1, 251):
+        fake.messages.append(SimpleNamespace(id=i, text=message_text(sample_record(i, when)), date=when))
+
+    # fresh deploy: no parser_state.json and nothing stored
+    assert parser.last_seen_id() == 0
+    asyncio.run(parser._fetch(fake, 100, parser.last_seen_id()))
+    assert sorted(r.message_id for r in parser.get_store().records()) == list(range(151, 251))
+    assert parser.last_seen_id() == 250
@@ -0,0 +1,29 @@
+"""ProfileStore kept in step with a RecordStore."""
+
+import json
+
+from profiles import ProfileStore
+from store import RecordStore
+
+
+def rental(message_id, user_id, dt):
+    return {"user": f"u{user_id}", "user_id": user_id, "amount": 100, "currency": "RUB",
+            "datetime": dt, "message_id": message_id}
+
+
+def test_rebuild_covers_what_the_index_has_not_loaded_yet(tmp_path):
+    (tmp_path / "database.json").write_text(json.dumps([rental(1, 1, "2025-03-01 10:00")]))
+    paths = str(tmp_path / "database.json"), str(tmp_path / "records.jsonl")
+    store = RecordStore(*paths)
+    store.background_refresh = True
+    store.refresh(force=True)
+    # another process appends after the refresh and before the profiles are built
+    RecordStore(*paths).append([rental(2, 2, "2025-03-01 11:00")])
+
+    profiles = ProfileStore()
+    profiles.sync(store, str(tmp_path / "profiles.json"))
+    assert profiles.get(2) is None
+    store.refresh(force=True)
+    profiles.sync(store, str(tmp_path / "profiles.json"))
+    assert profiles.get(1).hours == {10: 1}
+    assert profiles.get(2).hours == {11: 1}
@@ -0,0 +1,67 @@
+"""RecordStore loading and compaction."""
+
+import json
+
+from store import RecordStore
+
+
+def write(path, entries):
+    path.write_text(json.dumps(entries, ensure_ascii=False), encoding="utf-8")
+
+
+def read(path):
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def entry(**fields):
+    d = {"user": "a", "user_id": 1, "account": "001", "duration": "3", "until": "",
+         "method": "pay", "amount": 100, "currency": "RUB", "datetime": "2025-03-01 10:00",
+         "message_id": 1, "source": "ch"}
+    d.update(fields)
+    return d
+
+
+def test_bad_entry_is_skipped_not_the_snapshot(tmp_path):
+    write(tmp_path / "database.json", [entry(), entry(message_id=2, amount="n/a")])
+    store = RecordStore(str(tmp_path / "database.json"), str(tmp_path / "records.jsonl"))
+    assert len(store.records()) == 1
+    assert store.totals() == (100, 0)
+
+
+def test_compaction_is_lossless(tmp_path):
+    entries = [
+        entry(),
+        entry(message_id=2, amount=12.5, currency="USD"),
+        entry(message_id=3, datetime="вчера", note="ручная правка"),
+        entry(message_id=4, amount=None, currency=None, datetime=None),
+        entry(message_id=5, amount="n/a"),
+    ]
+    write(tmp_path / "database.json", entries[:3])
+    (tmp_path / "records.jsonl").write_text(
+        "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries[3:]), encoding="utf-8")
+    store = RecordStore(str(tmp_path / "database.json"), str(tmp_path / "records.jsonl"))
+    assert store.compact()
+    saved = read(tmp_path / "database.json")
+    key = lambda e: e["message_id"]
+    assert sorted(saved, key=key) == sorted(entries, key=key)
+    # float amounts count as int(amount), other currencies in neither total
+    assert store.totals() == (200, 0)
+    fresh = RecordStore(str(tmp_path / "database.json"), str(tmp_path / "records.jsonl"))
+    assert sorted((r.to_dict() for r in fresh.records()), key=key) \
+        == sorted((r.to_dict() for r in store.records()), key=key)
+
+
+def test_user_order_does_not_depend_on_compaction(tmp_path):
+    write(tmp_path / "database.json", [
+        entry(user="b", user_id=2, datetime="2025-03-01 12:00", message_id=1),
+        entry(user="c", user_id=3, datetime=None, message_id=2),
+    ])
+    paths = str(tmp_path / "database.json"), str(tmp_path / "records.jsonl")
+    store = RecordStore(*paths)
+    # in the log: a earlier than everyone, d undated like c but after it
+    store.append([entry(user="a", user_id=1, datetime="2025-02-01 09:00", message_id=3),
+                  entry(user="d", user_id=4, datetime=None, message_id=4),
+                  entry(user="b", user_id=2, datetime="2025-01-01 08:00", message_id=5)])
+    before = [t[0] for t in store.user_totals()]
+    store.compact()
+    assert before == [t[0] for t in RecordStore(*paths).user_totals()] == [3, 4, 2, 1]